@@ -2,6 +2,7 @@
 Console based module to generate analitical report.
 """
 
+import argparse
 import asyncio
 import time
 import pprint
@@ -40,6 +41,15 @@ async def init_client() -> repository.PgClient:
     return pg_client
 
 
+async def migrate() -> None:
+    # pools aren't created, their connections prepare statements on init
+    loop = asyncio.get_running_loop()
+    pg_client = repository.PgClient(Config()["citus_database"], loop)
+    applied = await pg_client.migrate()
+
+    print(fg.green + f"Applied migrations: {[m.version for m in applied]}" + rs.fg)
+
+
 async def get_season_ids(
     season_repo: repository.SeasonPgRepository, season_names: list[str]
 ) -> list[int]:
@@ -90,10 +100,42 @@ home_team_metrics: dict[str, MetricRecord] = {"score": MetricRecord(0, 1), "conc
 away_team_metrics: dict[str, MetricRecord] = {"points": MetricRecord(1.0, 1.8)}
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--rebuild-team-stats",
+        action="store_true",
+        help="recompute team_season_stats from the game table and exit",
+    )
+    parser.add_argument(
+        "--migrate",
+        action="store_true",
+        help="apply pending schema migrations and exit",
+    )
+    parser.add_argument(
+        "--sync-columnar",
+        action="store_true",
+        help="copy new games into game_columnar and exit",
+    )
+    args = parser.parse_args()
+
     loop = asyncio.new_event_loop()
+    if args.migrate:
+        loop.run_until_complete(migrate())
+        raise SystemExit(0)
+
     pg_client = loop.run_until_complete(init_client())
 
     match_repo = repository.MatchPgRepository(pg_client)
+    if args.rebuild_team_stats:
+        loop.run_until_complete(match_repo.rebuild_team_season_stats())
+        raise SystemExit(0)
+
+    if args.sync_columnar:
+        copied = loop.run_until_complete(match_repo.sync_columnar())
+        lag = loop.run_until_complete(match_repo.columnar_lag())
+        print(fg.green + f"Copied games: {copied}, lag: {dict(lag)}" + rs.fg)
+        raise SystemExit(0)
+
     season_repo = repository.SeasonPgRepository(pg_client)
     event_repo = repository.EventPgRepository(pg_client)
 
@@ -4,21 +4,36 @@ import os
 
 
 class Config:
+    """Settings of config.json overridden by config.local.json.
+
+    Files are read once per process, see reload.
+    """
+
     settings: dict[str, Any] = {}
+    loaded = False
     configpath = "config/config.json"
     localconfigpath = "config/config.local.json"
 
     def __init__(self) -> None:
+        if not Config.loaded:
+            self.reload()
+
+    @classmethod
+    def reload(cls) -> None:
+        """Re-reads config files, settings of all instances are updated."""
         folder = os.path.dirname(os.path.realpath(__file__))
-        with open(os.path.join(folder, self.configpath)) as f:
-            self.settings = json.load(f)
+        with open(os.path.join(folder, cls.configpath)) as f:
+            settings = json.load(f)
 
         try:
-            with open(os.path.join(folder, self.localconfigpath)) as f:
-                self.settings = {**self.settings, **json.load(f)}
+            with open(os.path.join(folder, cls.localconfigpath)) as f:
+                settings = {**settings, **json.load(f)}
         except FileNotFoundError:
             # local config is not required
             pass
 
+        Config.settings = settings
+        Config.loaded = True
+
     def __getitem__(self, key: Any) -> Any:
         return self.settings[key]
@@ -1 +1,3 @@
 from .model import FootballMatch, Venue, BaseMatch, Event, Season
+from .batch import MatchBatch, MatchRow
+from .markets import ScoreDistribution, Outcome
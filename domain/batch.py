@@ -0,0 +1,298 @@
+"""Columnar container for large sets of matches.
+
+MatchBatch keeps every match attribute as a separate NumPy column, it's
+a memory friendly alternative to list[FootballMatch].
+"""
+from typing import Any, Iterable, Iterator, Mapping, Sequence, Union, overload
+
+import numpy as np
+
+from .model import FootballMatch, MatchType, Venue
+
+# column name -> dtype, ordered as FootballMatch fields
+MATCH_COLUMNS: dict[str, Any] = {
+    "date": np.dtype("datetime64[us]"),
+    "team1_name": np.dtype(object),
+    "team2_name": np.dtype(object),
+    "team1_ft_score": np.dtype(np.int16),
+    "team2_ft_score": np.dtype(np.int16),
+    "venue": np.dtype(object),
+    "team1_id": np.dtype(object),
+    "team2_id": np.dtype(object),
+    "event_id": np.dtype(object),
+    "season_id": np.dtype(object),
+    "group": np.dtype(np.int32),
+    "team1_points": np.dtype(np.int8),
+    "team2_points": np.dtype(np.int8),
+    "team1_goals_time": np.dtype(object),
+    "team2_goals_time": np.dtype(object),
+    "team_1xg": np.dtype(np.float64),
+    "team_2xg": np.dtype(np.float64),
+    "team1_ht_score": np.dtype(np.int16),
+    "team2_ht_score": np.dtype(np.int16),
+}
+
+
+def missing_int(dtype: np.dtype) -> int:
+    """Missing values of integer columns are stored as the dtype minimum,
+    other negative values (e.g. group -1) stay valid."""
+    return int(np.iinfo(dtype).min)
+
+
+def _missing_value(dtype: np.dtype) -> Any:
+    """Value stored in place of None in a column of the given dtype."""
+    if dtype.kind in "iu":
+        return missing_int(dtype)
+    if dtype.kind == "f":
+        return np.nan
+    if dtype.kind == "M":
+        return np.datetime64("NaT")
+
+    return None
+
+
+def _to_column(name: str, values: list) -> np.ndarray:
+    dtype = MATCH_COLUMNS[name]
+    missing = _missing_value(dtype)
+    if missing is not None:
+        values = [missing if v is None else v for v in values]
+
+    if dtype.kind == "O":
+        # np.array would try to unpack nested lists (goals time)
+        column = np.empty(len(values), dtype=dtype)
+        column[:] = values
+        return column
+
+    return np.array(values, dtype=dtype)
+
+
+def _scalar(name: str, column: np.ndarray, index: int) -> Any:
+    value = column[index]
+    if isinstance(value, np.generic):
+        value = value.item()
+
+    if column.dtype.kind in "iu" and value == missing_int(column.dtype):
+        return None
+
+    return value
+
+
+def _to_python(name: str, column: np.ndarray) -> list:
+    """Converts column to the list of builtin python values."""
+    if column.dtype.kind == "M":
+        # NaT is converted to None
+        return column.astype(object).tolist()
+
+    values = column.tolist()
+    if column.dtype.kind in "iu":
+        missing = missing_int(column.dtype)
+        return [None if v == missing else v for v in values]
+
+    return values
+
+
+class MatchRow:
+    """Lazy view on a single match stored in a batch."""
+
+    __slots__ = ("_batch", "_index")
+
+    def __init__(self, batch: "MatchBatch", index: int):
+        self._batch = batch
+        self._index = index
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            column = self._batch.columns[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+        return _scalar(name, column, self._index)
+
+    def __repr__(self) -> str:
+        return f"MatchRow({self.as_dict()})"
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            name: _scalar(name, column, self._index)
+            for name, column in self._batch.columns.items()
+        }
+
+    def to_match(self) -> FootballMatch:
+        return FootballMatch(**self.as_dict())
+
+
+class MatchBatch:
+    """Stores matches as typed NumPy columns.
+
+    Integer slicing returns lazy row views, slices return batches which
+    share memory with the parent batch.
+    """
+
+    def __init__(self, columns: Mapping[str, np.ndarray]):
+        """Columns which aren't given are filled with missing values."""
+        unknown = set(columns) - set(MATCH_COLUMNS)
+        if unknown:
+            raise ValueError(f"MatchBatch: unknown columns {sorted(unknown)}")
+
+        sizes = {len(c) for c in columns.values()}
+        if len(sizes) > 1:
+            raise ValueError("MatchBatch: columns have different length")
+
+        self.size = sizes.pop() if sizes else 0
+        self.columns = {
+            name: np.asarray(columns[name], dtype=dtype)
+            if name in columns
+            else np.full(self.size, _missing_value(dtype), dtype=dtype)
+            for name, dtype in MATCH_COLUMNS.items()
+        }
+
+    @classmethod
+    def from_matches(cls, matches: Iterable[FootballMatch]) -> "MatchBatch":
+        matches = list(matches)
+        return cls(
+            {
+                name: _to_column(name, [getattr(m, name, None) for m in matches])
+                for name in MATCH_COLUMNS
+            }
+        )
+
+    @classmethod
+    def from_rows(
+        cls, rows: Sequence[Sequence[Any]], names: Sequence[str]
+    ) -> "MatchBatch":
+        """Builds batch from value tuples ordered as names, other columns are empty."""
+        return cls(
+            {
+                name: _to_column(name, list(values))
+                for name, values in zip(names, zip(*rows))
+            }
+        )
+
+    @classmethod
+    def from_dicts(cls, rows: Iterable[Mapping[str, Any]]) -> "MatchBatch":
+        rows = list(rows)
+        return cls(
+            {
+                name: _to_column(name, [r.get(name) for r in rows])
+                for name in MATCH_COLUMNS
+            }
+        )
+
+    @classmethod
+    def concat(cls, batches: Sequence["MatchBatch"]) -> "MatchBatch":
+        if not batches:
+            return cls({})
+
+        return cls(
+            {
+                name: np.concatenate([b.columns[name] for b in batches])
+                for name in MATCH_COLUMNS
+            }
+        )
+
+    def __len__(self) -> int:
+        return self.size
+
+    @overload
+    def __getitem__(self, key: int) -> MatchRow:
+        ...
+
+    @overload
+    def __getitem__(self, key: str) -> np.ndarray:
+        ...
+
+    @overload
+    def __getitem__(self, key: Union[slice, np.ndarray]) -> "MatchBatch":
+        ...
+
+    def __getitem__(self, key: Any) -> Any:
+        if isinstance(key, str):
+            return self.columns[key]
+
+        if isinstance(key, (int, np.integer)):
+            index = int(key)
+            if index < 0:
+                index += self.size
+            if not 0 <= index < self.size:
+                raise IndexError("MatchBatch index out of range")
+
+            return MatchRow(self, index)
+
+        # slices are zero-copy views, masks and index arrays copy data
+        return MatchBatch({name: c[key] for name, c in self.columns.items()})
+
+    def __iter__(self) -> Iterator[MatchRow]:
+        for index in range(self.size):
+            yield MatchRow(self, index)
+
+    # Market predicates, vectorized versions of FootballMatch methods.
+    # Each one returns boolean mask with a value per match, matches
+    # with a missing score are False.
+
+    def has_score(self) -> np.ndarray:
+        home, away = self.columns["team1_ft_score"], self.columns["team2_ft_score"]
+        return (home != missing_int(home.dtype)) & (away != missing_int(away.dtype))
+
+    @property
+    def total_goals(self) -> np.ndarray:
+        """Goals per match, NaN when score is missing."""
+        home, away = self.columns["team1_ft_score"], self.columns["team2_ft_score"]
+        total = home.astype(np.float64) + away
+        total[~self.has_score()] = np.nan
+        return total
+
+    def is_btts(self) -> np.ndarray:
+        return (self.columns["team1_ft_score"] > 0) & (
+            self.columns["team2_ft_score"] > 0
+        )
+
+    def is_home_win(self) -> np.ndarray:
+        home, away = self.columns["team1_ft_score"], self.columns["team2_ft_score"]
+        return (home > away) & self.has_score()
+
+    def is_draw(self) -> np.ndarray:
+        home, away = self.columns["team1_ft_score"], self.columns["team2_ft_score"]
+        return (home == away) & self.has_score()
+
+    def is_away_win(self) -> np.ndarray:
+        home, away = self.columns["team1_ft_score"], self.columns["team2_ft_score"]
+        return (home < away) & self.has_score()
+
+    def is_over(self, total: Union[float, Sequence[float]] = 2.5) -> np.ndarray:
+        """Returns 2D mask (totals x matches) when list of totals is given."""
+        totals = np.asarray(total, dtype=np.float64)
+        if totals.ndim:
+            totals = totals[:, np.newaxis]
+
+        return self.total_goals > totals
+
+    def is_under(self, total: Union[float, Sequence[float]] = 2.5) -> np.ndarray:
+        """Returns 2D mask (totals x matches) when list of totals is given."""
+        totals = np.asarray(total, dtype=np.float64)
+        if totals.ndim:
+            totals = totals[:, np.newaxis]
+
+        return self.total_goals < totals
+
+    def is_clean_sheet(self, venue: Venue = Venue.TEAM1) -> np.ndarray:
+        if venue == Venue.TEAM1:
+            return self.columns["team2_ft_score"] == 0
+        elif venue == Venue.TEAM2:
+            return self.columns["team1_ft_score"] == 0
+
+        raise ValueError(f"{venue} is not supported.")
+
+    def to_matches(self) -> list[FootballMatch]:
+        return [FootballMatch(**d) for d in self.as_dicts()]
+
+    def as_dicts(self) -> Iterator[dict[str, Any]]:
+        names = list(self.columns)
+        match_type = MatchType.FOOTBALL.value
+        for values in self.iter_tuples(names):
+            row = dict(zip(names, values))
+            row["match_type"] = match_type
+            yield row
+
+    def iter_tuples(self, names: Sequence[str]) -> Iterator[tuple]:
+        """Yields rows as tuples of builtin python values in given columns order."""
+        return zip(*(_to_python(name, self.columns[name]) for name in names))
@@ -0,0 +1,115 @@
+"""Betting market probabilities derived from a scoreline distribution."""
+from typing import Iterable, NamedTuple
+
+import numpy as np
+
+from .model import Venue
+
+
+class Outcome(NamedTuple):
+    """Probabilities of a bet settlement, they sum up to 1."""
+
+    win: float
+    push: float
+    lose: float
+
+
+def split_line(line: float) -> tuple[float, ...]:
+    """Quarter lines (e.g. 2.25) are split to adjacent whole and half lines."""
+    quarters = line * 4
+    if quarters != int(quarters):
+        raise ValueError(f"{line} is not a multiple of 0.25.")
+
+    if int(quarters) % 2:
+        return (line - 0.25, line + 0.25)
+
+    return (line,)
+
+
+class ScoreDistribution:
+    """Joint histogram of (home score, away score) of a set of games.
+
+    All markets are evaluated from the histogram, so a single database
+    query serves any number of lines.
+    """
+
+    def __init__(self, counts: np.ndarray):
+        # counts[home_score, away_score] -> number of games
+        self.counts = counts
+        self.total = int(counts.sum())
+
+        grid = np.indices(counts.shape)
+        self.home: np.ndarray = grid[0]
+        self.away: np.ndarray = grid[1]
+        self.goals = self.home + self.away
+        self.margin = self.home - self.away
+
+    @classmethod
+    def from_histogram(
+        cls, histogram: Iterable[tuple[int, int, int]]
+    ) -> "ScoreDistribution":
+        """Builds distribution from (home score, away score, games) rows."""
+        rows = [tuple(row) for row in histogram]
+        shape = (
+            max((row[0] for row in rows), default=0) + 1,
+            max((row[1] for row in rows), default=0) + 1,
+        )
+        counts = np.zeros(shape, dtype=np.int64)
+        for home_score, away_score, games in rows:
+            counts[home_score, away_score] += games
+
+        return cls(counts)
+
+    def probability(self, mask: np.ndarray) -> float:
+        if not self.total:
+            return 0.0
+
+        return float(self.counts[mask].sum() / self.total)
+
+    def settle(self, result: np.ndarray, line: float) -> Outcome:
+        """Settles bet which wins when result + line > 0, pushes when it's 0.
+
+        Quarter lines are settled as two bets of a half stake.
+        """
+        parts = [
+            Outcome(
+                self.probability(result + part > 0),
+                self.probability(result + part == 0),
+                self.probability(result + part < 0),
+            )
+            for part in split_line(line)
+        ]
+        return Outcome(*(sum(values) / len(parts) for values in zip(*parts)))
+
+    def over(self, line: float = 2.5) -> Outcome:
+        return self.settle(self.goals, -line)
+
+    def under(self, line: float = 2.5) -> Outcome:
+        return self.settle(-self.goals, line)
+
+    def asian_handicap(self, line: float, venue: Venue = Venue.TEAM1) -> Outcome:
+        """Handicap line is added to the score of team on given venue."""
+        if venue == Venue.TEAM1:
+            return self.settle(self.margin, line)
+        elif venue == Venue.TEAM2:
+            return self.settle(-self.margin, line)
+
+        raise ValueError(f"{venue} is not supported.")
+
+    def btts(self) -> float:
+        return self.probability((self.home > 0) & (self.away > 0))
+
+    def correct_score(self, home_score: int, away_score: int) -> float:
+        rows, columns = self.counts.shape
+        if not self.total or home_score >= rows or away_score >= columns:
+            return 0.0
+
+        return float(self.counts[home_score, away_score] / self.total)
+
+    def match_result(self) -> tuple[float, float, float]:
+        """1X2 probabilities: home win, draw, away win."""
+        return (
+            self.probability(self.margin > 0),
+            self.probability(self.margin == 0),
+            self.probability(self.margin < 0),
+        )
@@ -1,8 +1,10 @@
 """ Match entity: domain model and data model"""
-from dataclasses import dataclass, field, asdict
+from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
-from typing import Any, Optional, Union
+from typing import TYPE_CHECKING, Any, ClassVar, Mapping, Optional, Sequence, Union
+
+from .record import slotted, compiled_record, row_getter
 
 
 class MatchType(Enum):
@@ -29,6 +31,7 @@ class Event:
     name: str
 
 
+@slotted
 @dataclass
 class BaseMatch:
     date: datetime
@@ -44,10 +47,13 @@ class BaseMatch:
     team2_id: Optional[str]
 
     match_type: str
-    event_id: str
-    season_id: str
+    # name of event/season until it's resolved to database id
+    event_id: Union[int, str]
+    season_id: Union[int, str]
 
 
+@compiled_record(match_type=MatchType.FOOTBALL.value)
+@slotted
 @dataclass
 class FootballMatch(BaseMatch):
     group: int
@@ -64,20 +70,60 @@ class FootballMatch(BaseMatch):
     team1_ht_score: Optional[int] = None
     team2_ht_score: Optional[int] = None
 
-    def __init__(self, **kwargs: dict[str, Any]):
-        for attr, value in kwargs.items():
-            self.__dict__[attr] = value
+    field_names: ClassVar[tuple[str, ...]]
+
+    if TYPE_CHECKING:
+        # signatures of methods generated by compiled_record
+
+        def __init__(self, **kwargs: Any) -> None:
+            ...
+
+        def as_dict(self) -> dict:
+            ...
+
+        def as_tuple(self) -> tuple:
+            ...
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "FootballMatch":
+        """Creates match from a document, unknown keys (e.g. _id) are ignored."""
+        return cls(**{k: v for k, v in data.items() if k in cls.field_names})
 
-        self.match_type = MatchType.FOOTBALL.value
+    @classmethod
+    def from_row(
+        cls, row: Sequence[Any], names: Optional[Sequence[str]] = None
+    ) -> "FootballMatch":
+        """Creates match from values ordered as names (all fields by default)."""
+        return cls(**dict(zip(names or cls.field_names, row)))
+
+    @staticmethod
+    def row_getter(*names: str) -> Any:
+        """Returns callable which converts match to tuple of given attributes."""
+        return row_getter(*names)
 
     def is_btts(self) -> bool:
         return bool(self.team1_ft_score and self.team2_ft_score)
 
     def is_home_win(self) -> bool:
-        return bool(self.team1_ft_score and self.team2_ft_score)
+        return self.team1_ft_score > self.team2_ft_score
+
+    def is_draw(self) -> bool:
+        return self.team1_ft_score == self.team2_ft_score
+
+    def is_away_win(self) -> bool:
+        return self.team1_ft_score < self.team2_ft_score
 
     def is_over(self, total: float = 2.5) -> bool:
         return (self.team1_ft_score + self.team2_ft_score) > total
 
-    def as_dict(self) -> dict:
-        return asdict(self)
+    def is_under(self, total: float = 2.5) -> bool:
+        return (self.team1_ft_score + self.team2_ft_score) < total
+
+    def is_clean_sheet(self, venue: Venue = Venue.TEAM1) -> bool:
+        """Checks that team on given venue didn't concede."""
+        if venue == Venue.TEAM1:
+            return self.team2_ft_score == 0
+        elif venue == Venue.TEAM2:
+            return self.team1_ft_score == 0
+
+        raise ValueError(f"{venue} is not supported.")
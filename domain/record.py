@@ -0,0 +1,105 @@
+"""Helpers to turn dataclasses into compact, fast records.
+
+Python 3.9 dataclasses don't support slots, and generic helpers like
+dataclasses.asdict walk the fields on each call. Decorators below
+rebuild a dataclass with __slots__ and generate specialized methods once
+per class.
+"""
+from dataclasses import MISSING, fields
+from functools import lru_cache
+from operator import attrgetter
+from typing import Any, Callable, TypeVar
+
+T = TypeVar("T", bound=type)
+
+
+def slotted(cls: T) -> T:
+    """Recreates dataclass with __slots__ for fields declared on it."""
+    inherited: set[str] = set()
+    for base in cls.__mro__[1:]:
+        inherited.update(getattr(base, "__slots__", ()))
+
+    own_fields = tuple(f.name for f in fields(cls) if f.name not in inherited)
+
+    cls_dict = dict(cls.__dict__)
+    cls_dict["__slots__"] = own_fields
+    # class level defaults conflict with slots descriptors
+    for name in own_fields:
+        cls_dict.pop(name, None)
+
+    cls_dict.pop("__dict__", None)
+    cls_dict.pop("__weakref__", None)
+
+    return type(cls)(cls.__name__, cls.__bases__, cls_dict)  # type: ignore
+
+
+def _compile(name: str, source: str, namespace: dict[str, Any]) -> Callable:
+    exec(source, namespace)
+    return namespace[name]
+
+
+def compiled_record(**constants: Any) -> Callable[[T], T]:
+    """Generates keyword __init__, as_dict and as_tuple for a slotted dataclass.
+
+    Generated __init__ accepts any subset of fields, applies defaults for
+    omitted fields and sets given constants, e.g. match type.
+    """
+
+    def wrap(cls: T) -> T:
+        record_fields = fields(cls)
+        names = tuple(f.name for f in record_fields)
+        namespace: dict[str, Any] = {"_MISSING": MISSING, "_constants": constants}
+
+        args, body = [], []
+        for f in record_fields:
+            if f.default is not MISSING:
+                namespace[f"_default_{f.name}"] = f.default
+                args.append(f"{f.name}=_default_{f.name}")
+                body.append(f"    self.{f.name} = {f.name}")
+            elif f.default_factory is not MISSING:  # type: ignore
+                namespace[f"_factory_{f.name}"] = f.default_factory  # type: ignore
+                args.append(f"{f.name}=_MISSING")
+                body.append(
+                    f"    self.{f.name} = _factory_{f.name}() "
+                    f"if {f.name} is _MISSING else {f.name}"
+                )
+            else:
+                args.append(f"{f.name}=_MISSING")
+                body.append(f"    if {f.name} is not _MISSING: self.{f.name} = {f.name}")
+
+        body.extend(f"    self.{k} = _constants[{k!r}]" for k in constants)
+
+        init_source = f"def __init__(self, *, {', '.join(args)}):\n"
+        init_source += "\n".join(body or ["    pass"])
+        init = _compile("__init__", init_source, namespace)
+
+        items = ", ".join(f"{n!r}: self.{n}" for n in names)
+        as_dict = _compile(
+            "as_dict", f"def as_dict(self):\n    return {{{items}}}", namespace
+        )
+
+        getter = row_getter(*names)
+
+        def as_tuple(self: Any) -> tuple:
+            return getter(self)
+
+        for method in (init, as_dict, as_tuple):
+            method.__qualname__ = f"{cls.__qualname__}.{method.__name__}"
+            setattr(cls, method.__name__, method)
+
+        setattr(cls, "field_names", names)
+
+        return cls
+
+    return wrap
+
+
+@lru_cache(maxsize=None)
+def row_getter(*names: str) -> Callable[[Any], tuple]:
+    """Returns C-level callable which converts record to tuple of given fields."""
+    if len(names) == 1:
+        # attrgetter returns bare value for a single attribute
+        single = attrgetter(names[0])
+        return lambda obj: (single(obj),)
+
+    return attrgetter(*names)
@@ -1,2 +1,4 @@
 from .base import EventBus
-from .memory_bus import MemoryEventBus
+from .event_log import EventLog, LogEntry
+from .memory_bus import MemoryEventBus, Subscription, ExecutionPolicy
+from .socket_bus import SocketEventBus, SocketBroker
@@ -35,3 +35,7 @@ class EventBus(metaclass=abc.ABCMeta):
             events: input events for which handler(s) will be called
         """
         raise NotImplementedError()
+
+    def close(self) -> Any:
+        """Delivers pending events and releases bus resources."""
+        raise NotImplementedError()
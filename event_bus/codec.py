@@ -0,0 +1,166 @@
+"""Compact binary serialization of bus events.
+
+Registered event types (FootballMatch by default) are encoded field by
+field with a one byte tag per value. Only None, int, float, str, naive
+datetime and lists of them are supported, so decoding frames of another
+process never runs code other than constructors of registered types.
+"""
+import struct
+from datetime import datetime, timedelta
+from typing import Any
+
+from domain import FootballMatch
+
+# value tags, PICKLED values of older versions are rejected
+ABSENT, NONE, INT, FLOAT, STR, DATETIME, PICKLED, LIST = range(8)
+
+EPOCH = datetime(1970, 1, 1)
+
+U8 = struct.Struct("!B")
+U16 = struct.Struct("!H")
+U32 = struct.Struct("!I")
+I64 = struct.Struct("!q")
+F64 = struct.Struct("!d")
+
+
+def type_name(event_type: Any) -> str:
+    return f"{event_type.__module__}.{event_type.__qualname__}"
+
+
+class Reader:
+    """Sequential reader over bytes buffer."""
+
+    __slots__ = ("data", "pos")
+
+    def __init__(self, data: bytes, pos: int = 0):
+        self.data = memoryview(data)
+        self.pos = pos
+
+    def unpack(self, fmt: struct.Struct) -> Any:
+        (value,) = fmt.unpack_from(self.data, self.pos)
+        self.pos += fmt.size
+        return value
+
+    def read(self, size: int) -> bytes:
+        start, end = self.pos, self.pos + size
+        self.pos = end
+        return bytes(self.data[start:end])
+
+    def read_str(self) -> str:
+        return self.read(self.unpack(U32)).decode()
+
+    def read_short_str(self) -> str:
+        return self.read(self.unpack(U16)).decode()
+
+    def at_end(self) -> bool:
+        return self.pos >= len(self.data)
+
+
+def pack_str(value: str) -> bytes:
+    raw = value.encode()
+    return U32.pack(len(raw)) + raw
+
+
+def pack_short_str(value: str) -> bytes:
+    raw = value.encode()
+    return U16.pack(len(raw)) + raw
+
+
+def pack_value(value: Any) -> bytes:
+    if value is None:
+        return U8.pack(NONE)
+    elif type(value) is int and -(2 ** 63) <= value < 2 ** 63:
+        return U8.pack(INT) + I64.pack(value)
+    elif type(value) is float:
+        return U8.pack(FLOAT) + F64.pack(value)
+    elif type(value) is str:
+        return U8.pack(STR) + pack_str(value)
+    elif type(value) is datetime and value.tzinfo is None:
+        delta = value - EPOCH
+        micros = (delta.days * 86400 + delta.seconds) * 10 ** 6 + delta.microseconds
+        return U8.pack(DATETIME) + I64.pack(micros)
+    elif type(value) is list:
+        items = b"".join(map(pack_value, value))
+        return U8.pack(LIST) + U32.pack(len(value)) + items
+
+    raise TypeError(f"EventCodec: {type(value).__name__} value can't be encoded.")
+
+
+def unpack_value(reader: Reader) -> Any:
+    tag = reader.unpack(U8)
+    if tag == NONE:
+        return None
+    elif tag == INT:
+        return reader.unpack(I64)
+    elif tag == FLOAT:
+        return reader.unpack(F64)
+    elif tag == STR:
+        return reader.read_str()
+    elif tag == DATETIME:
+        return EPOCH + timedelta(microseconds=reader.unpack(I64))
+    elif tag == LIST:
+        return [unpack_value(reader) for _ in range(reader.unpack(U32))]
+
+    raise ValueError(f"EventCodec: unknown value tag {tag}.")
+
+
+class RecordCodec:
+    """Encodes record attributes in fixed order, missing attributes are kept missing."""
+
+    def __init__(self, record_type: Any, names: tuple[str, ...]):
+        self.record_type = record_type
+        self.names = names
+
+    def encode(self, event: Any) -> bytes:
+        parts = []
+        for name in self.names:
+            try:
+                parts.append(pack_value(getattr(event, name)))
+            except AttributeError:
+                parts.append(U8.pack(ABSENT))
+
+        return b"".join(parts)
+
+    def decode(self, reader: Reader) -> Any:
+        values = {}
+        for name in self.names:
+            if reader.data[reader.pos] == ABSENT:
+                reader.pos += 1
+            else:
+                values[name] = unpack_value(reader)
+
+        return self.record_type(**values)
+
+
+class EventCodec:
+    """Serializes events together with their type name."""
+
+    def __init__(self) -> None:
+        self.codecs: dict[str, RecordCodec] = {}
+        self.register(FootballMatch, FootballMatch.field_names)
+
+    def register(self, event_type: Any, names: tuple[str, ...]) -> None:
+        """Enables compact encoding for event type with given attributes."""
+        self.codecs[type_name(event_type)] = RecordCodec(event_type, names)
+
+    def encode(self, event: Any) -> bytes:
+        name = type_name(event.__class__)
+        codec = self.codecs.get(name)
+        if codec is None:
+            raise TypeError(f"EventCodec: event type {name} is not registered.")
+
+        return pack_short_str(name) + codec.encode(event)
+
+    def decode(self, reader: Reader) -> Any:
+        name = reader.read_short_str()
+        codec = self.codecs.get(name)
+        if codec is None:
+            raise ValueError(f"EventCodec: event type {name} is not registered.")
+
+        return codec.decode(reader)
+
+    def encode_many(self, events: list) -> bytes:
+        return U32.pack(len(events)) + b"".join(self.encode(e) for e in events)
+
+    def decode_many(self, reader: Reader) -> list:
+        return [self.decode(reader) for _ in range(reader.unpack(U32))]
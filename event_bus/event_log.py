@@ -0,0 +1,180 @@
+"""Durable append-only log of bus events.
+
+Log is split into preallocated, memory-mapped segment files. Each record
+is stored as [length: u32][crc32: u32][payload], zero length marks the end
+of written data. Offsets are logical byte positions across all segments,
+segment file name is the offset of its first record.
+"""
+import mmap
+import os
+import struct
+import zlib
+from typing import Any, Iterator, NamedTuple, Optional
+
+from .codec import EventCodec, Reader
+
+HEADER = struct.Struct("!II")
+SEGMENT_SUFFIX = ".log"
+CHECKPOINT_SUFFIX = ".checkpoint"
+
+
+class LogEntry(NamedTuple):
+    offset: int
+    # position right after the record, it's stored as consumer checkpoint
+    next_offset: int
+    event: Any
+
+
+class Segment:
+    """Single memory-mapped log file."""
+
+    def __init__(self, path: str, base: int, size: int):
+        self.path = path
+        self.base = base
+
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.truncate(size)
+
+        self.file = open(path, "r+b")
+        self.size = os.path.getsize(path)
+        self.mmap = mmap.mmap(self.file.fileno(), self.size)
+
+        # torn write at the tail is discarded
+        self.end = 0
+        for self.end, _ in self.records(0):
+            pass
+
+    def read(self, pos: int) -> Optional[tuple[int, bytes]]:
+        """Returns (position after record, payload) or None at the end of data."""
+        if pos + HEADER.size > self.size:
+            return None
+
+        length, crc = HEADER.unpack_from(self.mmap, pos)
+        start, end = pos + HEADER.size, pos + HEADER.size + length
+        if not length or end > self.size:
+            return None
+
+        payload = self.mmap[start:end]
+        if zlib.crc32(payload) != crc:
+            return None
+
+        return end, payload
+
+    def records(self, pos: int) -> Iterator[tuple[int, bytes]]:
+        record = self.read(pos)
+        while record:
+            yield record
+            record = self.read(record[0])
+
+    def append(self, payload: bytes) -> Optional[int]:
+        """Writes record, returns its position or None when segment is full."""
+        pos = self.end
+        start, end = pos + HEADER.size, pos + HEADER.size + len(payload)
+        if end > self.size:
+            return None
+
+        self.mmap[start:end] = payload
+        # header goes last, so readers never see partially written record
+        self.mmap[pos:start] = HEADER.pack(len(payload), zlib.crc32(payload))
+        self.end = end
+        return pos
+
+    def flush(self) -> None:
+        self.mmap.flush()
+
+    def close(self) -> None:
+        self.mmap.close()
+        self.file.close()
+
+
+class EventLog:
+    """Segmented append-only event log with replay and consumer checkpoints."""
+
+    def __init__(
+        self,
+        directory: str,
+        segment_size: int = 64 * 1024 * 1024,
+        codec: Optional[EventCodec] = None,
+    ):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.codec = codec or EventCodec()
+        os.makedirs(directory, exist_ok=True)
+
+        bases = sorted(
+            int(os.path.splitext(name)[0])
+            for name in os.listdir(directory)
+            if name.endswith(SEGMENT_SUFFIX)
+        )
+        self.segments = [self._open_segment(base) for base in bases or [0]]
+
+    @property
+    def end_offset(self) -> int:
+        last = self.segments[-1]
+        return last.base + last.end
+
+    def append(self, event: Any) -> int:
+        """Stores event, returns its offset."""
+        payload = self.codec.encode(event)
+        if HEADER.size + len(payload) > self.segment_size:
+            raise ValueError("EventLog: event doesn't fit into a segment.")
+
+        segment = self.segments[-1]
+        pos = segment.append(payload)
+        if pos is None:
+            segment.flush()
+            segment = self._open_segment(self.end_offset)
+            self.segments.append(segment)
+            pos = segment.append(payload)
+            assert pos is not None
+
+        return segment.base + pos
+
+    def replay(self, from_offset: int = 0) -> Iterator[LogEntry]:
+        """Streams stored events starting from given offset."""
+        for i, segment in enumerate(self.segments):
+            next_base = (
+                self.segments[i + 1].base if i + 1 < len(self.segments) else None
+            )
+            if next_base is not None and from_offset >= next_base:
+                continue
+
+            pos = max(from_offset - segment.base, 0)
+            for end, payload in segment.records(pos):
+                event = self.codec.decode(Reader(payload))
+                yield LogEntry(segment.base + pos, segment.base + end, event)
+                pos = end
+
+    def load_checkpoint(self, consumer: str) -> int:
+        try:
+            with open(self._checkpoint_path(consumer)) as f:
+                return int(f.read())
+        except FileNotFoundError:
+            return 0
+
+    def save_checkpoint(self, consumer: str, offset: int) -> None:
+        path = self._checkpoint_path(consumer)
+        with open(path + ".tmp", "w") as f:
+            f.write(str(offset))
+            f.flush()
+            os.fsync(f.fileno())
+
+        # rename is atomic, checkpoint is never half written
+        os.replace(path + ".tmp", path)
+
+    def flush(self) -> None:
+        """Flushes written records to disk."""
+        self.segments[-1].flush()
+
+    def close(self) -> None:
+        for segment in self.segments:
+            segment.flush()
+            segment.close()
+
+    def _open_segment(self, base: int) -> Segment:
+        path = os.path.join(self.directory, f"{base:020d}{SEGMENT_SUFFIX}")
+        return Segment(path, base, self.segment_size)
+
+    def _checkpoint_path(self, consumer: str) -> str:
+        return os.path.join(self.directory, f"{consumer}{CHECKPOINT_SUFFIX}")
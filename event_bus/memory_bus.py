@@ -1,35 +1,336 @@
 """Local In-memory event bus implementation."""
 import inspect
-from typing import Any, Callable
+import logging
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Callable, Optional
 from collections import defaultdict
 import asyncio
 
 from .base import EventBus
+from .event_log import EventLog
+
+
+class ExecutionPolicy(Enum):
+    """Where synchronous handler is executed."""
+
+    INLINE = "inline"
+    THREAD = "thread"
+    # handler and events have to be picklable
+    PROCESS = "process"
+
+
+@dataclass
+class Subscription:
+    """Handler registered for an event type.
+
+    Queued subscription owns a bounded queue consumed by worker tasks,
+    so a slow handler doesn't delay other subscribers. Batching
+    subscription buffers single events and delivers them as a list.
+    """
+
+    handler: Callable
+    policy: ExecutionPolicy = ExecutionPolicy.INLINE
+    queue_size: int = 0
+    workers_count: int = 0
+    batch_size: int = 0
+    max_latency: float = 0.0
+
+    queue: Optional[asyncio.Queue] = None
+    workers: list[asyncio.Task] = field(default_factory=list)
+    buffer: list = field(default_factory=list)
+    timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def is_queued(self) -> bool:
+        return self.workers_count > 0
+
+    @property
+    def is_batched(self) -> bool:
+        return self.batch_size > 0
 
 
 class MemoryEventBus(EventBus):
-    """In-memory message bus implementation."""
+    """In-memory message bus implementation.
+
+    By default handlers are awaited one by one inside publish call.
+    With workers > 0 every subscription gets a queue of queue_size
+    events and publishing awaits only when some queue is full.
+    Published events are persisted when event_log is given.
+    """
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        queue_size: int = 100,
+        workers: int = 0,
+        thread_pool_size: Optional[int] = None,
+        process_pool_size: Optional[int] = None,
+        event_log: Optional[EventLog] = None,
+    ) -> None:
         super().__init__()
-        self.handlers: dict[str, list[Callable]] = defaultdict(list)
+        self.event_log = event_log
+        self.queue_size = queue_size
+        self.workers = workers
+        self.thread_pool_size = thread_pool_size
+        self.process_pool_size = process_pool_size
+        self.executors: dict[ExecutionPolicy, Executor] = {}
+        self.closed = False
+        self.handlers: dict[Any, list[Subscription]] = defaultdict(list)
+        self.flush_tasks: set[asyncio.Task] = set()
+        self.offloaded: set[asyncio.Future] = set()
+
+    def register(
+        self,
+        event_type: Any,
+        handler: Callable,
+        queue_size: Optional[int] = None,
+        workers: Optional[int] = None,
+        policy: ExecutionPolicy = ExecutionPolicy.INLINE,
+    ) -> Subscription:
+        """Registers handler for a particular event type.
+
+        Args:
+            queue_size: max queued events, overrides bus default
+            workers: concurrent handler calls, 0 means inline execution
+            policy: runs synchronous handler in the loop, thread or process pool
+        """
+        if policy != ExecutionPolicy.INLINE and inspect.iscoroutinefunction(handler):
+            raise ValueError("MemoryEventBus: coroutine handler can't be offloaded.")
+
+        subscription = Subscription(
+            handler,
+            policy=policy,
+            queue_size=self.queue_size if queue_size is None else queue_size,
+            workers_count=self.workers if workers is None else workers,
+        )
+        self.handlers[event_type].append(subscription)
+        return subscription
 
-    def register(self, event_type: Any, handler: Callable) -> None:
-        """Registers handler for a particular event type."""
-        self.handlers[event_type].append(handler)
+    def register_batch(
+        self,
+        event_type: Any,
+        handler: Callable,
+        max_size: int = 100,
+        max_latency: float = 1.0,
+        queue_size: Optional[int] = None,
+        workers: Optional[int] = None,
+        policy: ExecutionPolicy = ExecutionPolicy.INLINE,
+    ) -> Subscription:
+        """Registers handler which receives lists of events.
 
-    async def publish_one_async(self, event: Any) -> None:
-        """Sends single event to all registered handlers."""
-        for h in self.handlers[event.__class__]:
-            if inspect.iscoroutinefunction(h):
-                await h(event)
+        Single events are coalesced and delivered once max_size events
+        are buffered or max_latency seconds passed since the first one.
+        """
+        subscription = self.register(event_type, handler, queue_size, workers, policy)
+        subscription.batch_size = max_size
+        subscription.max_latency = max_latency
+        return subscription
+
+    async def publish_one_async(self, event: Any) -> list:
+        """Sends single event to all registered handlers.
+
+        Returns results of handlers called directly, queued and batching
+        subscriptions are skipped.
+        """
+        self._check_closed()
+        if self.event_log:
+            self.event_log.append(event)
+
+        results = []
+        for s in self.handlers[event.__class__]:
+            if s.is_batched:
+                await self._buffer(s, [event])
+            elif s.is_queued:
+                await self._deliver(s, event)
             else:
-                h(event)
+                results.append(await self._deliver(s, event))
+
+        return results
 
-    async def publish_batch_async(self, event_type: Any, events: list) -> None:
+    async def publish_batch_async(self, event_type: Any, events: list) -> list:
         """Sends batch of events to all registered handlers."""
-        for h in self.handlers[event_type]:
-            if inspect.iscoroutinefunction(h):
-                await h(events)
+        self._check_closed()
+        if self.event_log:
+            for event in events:
+                self.event_log.append(event)
+
+        results = []
+        for s in self.handlers[event_type]:
+            if s.is_batched:
+                await self._buffer(s, events)
+            elif s.is_queued:
+                await self._deliver(s, events)
             else:
-                h(events)
+                results.append(await self._deliver(s, events))
+
+        return results
+
+    async def replay(
+        self,
+        event_type: Any,
+        handler: Callable,
+        consumer: Optional[str] = None,
+        from_offset: int = 0,
+        checkpoint_every: int = 1000,
+    ) -> int:
+        """Streams events of given type from the event log to handler.
+
+        Named consumer resumes from its last checkpoint. Returns offset
+        after the last replayed event.
+        """
+        if not self.event_log:
+            raise RuntimeError("MemoryEventBus: event log is not configured.")
+
+        if consumer:
+            from_offset = self.event_log.load_checkpoint(consumer)
+
+        s = Subscription(handler)
+        offset = from_offset
+        for i, entry in enumerate(self.event_log.replay(from_offset), 1):
+            if isinstance(entry.event, event_type):
+                await self._call(s, entry.event)
+            offset = entry.next_offset
+
+            if i % checkpoint_every == 0:
+                if consumer:
+                    self.event_log.save_checkpoint(consumer, offset)
+                # let other tasks run during long replay
+                await asyncio.sleep(0)
+
+        if consumer:
+            self.event_log.save_checkpoint(consumer, offset)
+
+        return offset
+
+    async def flush(self) -> None:
+        """Delivers all buffered events of batching subscriptions."""
+        for s in self._subscriptions():
+            await self._flush(s)
+
+        await asyncio.gather(*self.flush_tasks, return_exceptions=True)
+
+    async def drain(self) -> None:
+        """Waits until all buffered and queued events are processed."""
+        await self.flush()
+        await asyncio.gather(
+            *(s.queue.join() for s in self._subscriptions() if s.queue)
+        )
+
+    async def close(self) -> None:
+        """Processes pending events and stops worker tasks."""
+        self.closed = True
+        await self.drain()
+
+        workers = [w for s in self._subscriptions() for w in s.workers]
+        for w in workers:
+            w.cancel()
+
+        await asyncio.gather(*workers, return_exceptions=True)
+        for s in self._subscriptions():
+            s.workers.clear()
+            s.queue = None
+
+        # calls of publishers still running, shutdown joins pool
+        # threads and processes so it's kept out of the loop too
+        await asyncio.gather(*self.offloaded, return_exceptions=True)
+        await asyncio.gather(
+            *(asyncio.to_thread(e.shutdown, wait=True) for e in self.executors.values())
+        )
+        self.executors.clear()
+
+        if self.event_log:
+            self.event_log.flush()
+
+    def _check_closed(self) -> None:
+        if self.closed:
+            raise RuntimeError("MemoryEventBus: publish to closed bus.")
+
+    async def _deliver(self, s: Subscription, payload: Any) -> Any:
+        if s.is_queued:
+            await self._get_queue(s).put(payload)
+            return None
+
+        return await self._call(s, payload)
+
+    async def _buffer(self, s: Subscription, events: list) -> None:
+        s.buffer.extend(events)
+        size = s.batch_size
+        while len(s.buffer) >= size:
+            batch, s.buffer = s.buffer[:size], s.buffer[size:]
+            await self._deliver(s, batch)
+
+        if not s.buffer:
+            self._cancel_timer(s)
+        elif s.timer is None:
+            s.timer = asyncio.get_running_loop().call_later(
+                s.max_latency, self._on_deadline, s
+            )
+
+    def _on_deadline(self, s: Subscription) -> None:
+        s.timer = None
+        task = asyncio.create_task(self._flush_logged(s))
+        self.flush_tasks.add(task)
+        task.add_done_callback(self.flush_tasks.discard)
+
+    async def _flush_logged(self, s: Subscription) -> None:
+        try:
+            await self._flush(s)
+        except Exception:
+            logging.exception("Event handler %s failed.", s.handler)
+
+    async def _flush(self, s: Subscription) -> None:
+        self._cancel_timer(s)
+        if s.buffer:
+            batch, s.buffer = s.buffer, []
+            await self._deliver(s, batch)
+
+    def _cancel_timer(self, s: Subscription) -> None:
+        if s.timer is not None:
+            s.timer.cancel()
+            s.timer = None
+
+    def _subscriptions(self) -> list[Subscription]:
+        return [s for subscriptions in self.handlers.values() for s in subscriptions]
+
+    def _get_queue(self, s: Subscription) -> asyncio.Queue:
+        # queue and workers are bound to the running loop, create them lazily
+        if s.queue is None:
+            s.queue = asyncio.Queue(maxsize=s.queue_size)
+            s.workers = [
+                asyncio.create_task(self._worker(s)) for _ in range(s.workers_count)
+            ]
+
+        return s.queue
+
+    async def _worker(self, s: Subscription) -> None:
+        assert s.queue is not None
+        while True:
+            payload = await s.queue.get()
+            try:
+                await self._call(s, payload)
+            except Exception:
+                logging.exception("Event handler %s failed.", s.handler)
+            finally:
+                s.queue.task_done()
+
+    async def _call(self, s: Subscription, payload: Any) -> Any:
+        if inspect.iscoroutinefunction(s.handler):
+            return await s.handler(payload)
+        elif s.policy == ExecutionPolicy.INLINE:
+            return s.handler(payload)
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._get_executor(s.policy), s.handler, payload)
+        self.offloaded.add(future)
+        future.add_done_callback(self.offloaded.discard)
+        return await future
+
+    def _get_executor(self, policy: ExecutionPolicy) -> Executor:
+        if policy not in self.executors:
+            if policy == ExecutionPolicy.THREAD:
+                self.executors[policy] = ThreadPoolExecutor(self.thread_pool_size)
+            else:
+                self.executors[policy] = ProcessPoolExecutor(self.process_pool_size)
+
+        return self.executors[policy]
@@ -0,0 +1,212 @@
+"""Cross-process event bus over Unix domain sockets.
+
+SocketBroker accepts bus connections from processes of the same host and
+fans out published events to every connection subscribed to the event
+type. Broker handles frames one by one and forwards them in the order of
+arrival, so all subscribers see events of a type in the same order.
+
+Socket file is accessible by its owner only, so the bus is shared by
+processes of the same user. Events are decoded by EventCodec, which
+accepts registered event types only.
+"""
+import asyncio
+import itertools
+import logging
+import os
+from typing import Any, Callable, Optional
+
+from .base import EventBus
+from .codec import EventCodec, Reader, U8, U32, I64, pack_short_str, type_name
+from .memory_bus import MemoryEventBus
+
+SUBSCRIBE, PUBLISH_ONE, PUBLISH_BATCH, SYNC = range(1, 5)
+
+
+def pack_frame(kind: int, body: bytes) -> bytes:
+    return U32.pack(len(body) + 1) + U8.pack(kind) + body
+
+
+async def read_frame(reader: asyncio.StreamReader) -> tuple[int, bytes]:
+    size = U32.unpack(await reader.readexactly(U32.size))[0]
+    frame = await reader.readexactly(size)
+    return frame[0], frame[1:]
+
+
+class SocketBroker:
+    """Routes frames between SocketEventBus connections."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.subscribers: dict[str, set[asyncio.StreamWriter]] = {}
+
+    async def start(self) -> None:
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+        self.server = await asyncio.start_unix_server(self._serve, path=self.path)
+        os.chmod(self.path, 0o600)
+
+    async def close(self) -> None:
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    async def _serve(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            while True:
+                kind, body = await read_frame(reader)
+                if kind == SUBSCRIBE:
+                    self.subscribers.setdefault(body.decode(), set()).add(writer)
+                elif kind in (PUBLISH_ONE, PUBLISH_BATCH):
+                    await self._fan_out(body, pack_frame(kind, body))
+                elif kind == SYNC:
+                    # frames received before are already forwarded
+                    writer.write(pack_frame(SYNC, body))
+                    await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for writers in self.subscribers.values():
+                writers.discard(writer)
+            writer.close()
+
+    async def _fan_out(self, body: bytes, frame: bytes) -> None:
+        name = Reader(body).read_short_str()
+        writers = list(self.subscribers.get(name, ()))
+        for w in writers:
+            w.write(frame)
+
+        # slow subscriber applies backpressure to publishers
+        for w in writers:
+            try:
+                await w.drain()
+            except ConnectionError:
+                self.subscribers[name].discard(w)
+
+
+class SocketEventBus(EventBus):
+    """Event bus shared by processes connected to the same SocketBroker.
+
+    Received events are dispatched to handlers by a local MemoryEventBus,
+    so all its registration options are available. Unlike MemoryEventBus,
+    publishing returns no handler results and handler errors are logged
+    by the receiving process. Published event types have to be registered
+    with the codec.
+    """
+
+    def __init__(
+        self, path: str, codec: Optional[EventCodec] = None, **local_options: Any
+    ):
+        self.path = path
+        self.codec = codec or EventCodec()
+        self.local = MemoryEventBus(**local_options)
+        self.event_types: dict[str, Any] = {}
+
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.reader_task: Optional[asyncio.Task] = None
+        self.sync_ids = itertools.count()
+        self.sync_waiters: dict[int, asyncio.Future] = {}
+
+    def register(self, event_type: Any, handler: Callable, **options: Any) -> Any:
+        """Registers local handler and subscribes to event type on the broker."""
+        self._subscribe(event_type)
+        return self.local.register(event_type, handler, **options)
+
+    def register_batch(self, event_type: Any, handler: Callable, **options: Any) -> Any:
+        self._subscribe(event_type)
+        return self.local.register_batch(event_type, handler, **options)
+
+    async def connect(self) -> None:
+        if self.writer:
+            return
+
+        self.reader, self.writer = await asyncio.open_unix_connection(self.path)
+        for name in self.event_types:
+            self.writer.write(pack_frame(SUBSCRIBE, name.encode()))
+
+        self.reader_task = asyncio.create_task(self._read_events())
+
+    async def publish_one_async(self, event: Any) -> list:
+        """Sends event to subscribers of all connected processes."""
+        await self._send(PUBLISH_ONE, event.__class__, self.codec.encode(event))
+        return []
+
+    async def publish_batch_async(self, event_type: Any, events: list) -> list:
+        await self._send(PUBLISH_BATCH, event_type, self.codec.encode_many(events))
+        return []
+
+    async def drain(self) -> None:
+        """Waits until events published so far are handled by this process."""
+        await self.connect()
+        assert self.writer is not None
+
+        sync_id = next(self.sync_ids)
+        waiter = asyncio.get_running_loop().create_future()
+        self.sync_waiters[sync_id] = waiter
+        self.writer.write(pack_frame(SYNC, I64.pack(sync_id)))
+        await self.writer.drain()
+        await waiter
+        await self.local.drain()
+
+    async def close(self) -> None:
+        if self.writer:
+            await self.drain()
+            self.writer.close()
+            self.writer = None
+
+        if self.reader_task:
+            self.reader_task.cancel()
+            await asyncio.gather(self.reader_task, return_exceptions=True)
+            self.reader_task = None
+
+        await self.local.close()
+
+    def _subscribe(self, event_type: Any) -> None:
+        name = type_name(event_type)
+        if name in self.event_types:
+            return
+
+        self.event_types[name] = event_type
+        if self.writer:
+            self.writer.write(pack_frame(SUBSCRIBE, name.encode()))
+
+    async def _send(self, kind: int, event_type: Any, payload: bytes) -> None:
+        await self.connect()
+        assert self.writer is not None
+
+        name = pack_short_str(type_name(event_type))
+        self.writer.write(pack_frame(kind, name + payload))
+        await self.writer.drain()
+
+    async def _read_events(self) -> None:
+        assert self.reader is not None
+        while True:
+            try:
+                kind, body = await read_frame(self.reader)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                return
+
+            reader = Reader(body)
+            if kind == SYNC:
+                waiter = self.sync_waiters.pop(reader.unpack(I64), None)
+                if waiter and not waiter.done():
+                    waiter.set_result(None)
+                continue
+
+            try:
+                event_type = self.event_types[reader.read_short_str()]
+                if kind == PUBLISH_ONE:
+                    await self.local.publish_one_async(self.codec.decode(reader))
+                else:
+                    events = self.codec.decode_many(reader)
+                    await self.local.publish_batch_async(event_type, events)
+            except Exception:
+                logging.exception("SocketEventBus: failed to handle event.")
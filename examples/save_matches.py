@@ -4,6 +4,8 @@ from twisted.internet import asyncioreactor
 from scrapy.crawler import CrawlerProcess
 
 from config import Config
+from domain import FootballMatch
+from event_bus import MemoryEventBus
 from parsers.betstady import BetStadySpider
 import parsers.betstady_datasets as betstady_datasets
 import repository
@@ -17,9 +19,12 @@ async def init_task():
     return pg_client
 
 
-async def finalyze_task(records, match_repo):
-    await match_repo.insert_many(records)
-    print(f"Seccessfully saved: {len(records)} records")
+def save_task(match_repo):
+    async def save(records):
+        result = await match_repo.insert_many(records)
+        print(f"Seccessfully saved: {result.inserted} records, skipped: {result.skipped}")
+
+    return save
 
 
 if __name__ == "__main__":
@@ -39,13 +44,18 @@ if __name__ == "__main__":
         betstady_datasets.mls,
     ]
 
+    event_bus = MemoryEventBus()
+    event_bus.register_batch(
+        FootballMatch, save_task(match_repo), max_size=1000, max_latency=30
+    )
+
     process = CrawlerProcess()
-    items_buffer = []
 
     for d in datasets:
         process.crawl(
-            BetStadySpider, pg_client=pg_client, items_buffer=items_buffer, dataset=d
+            BetStadySpider, pg_client=pg_client, event_bus=event_bus, dataset=d
         )
 
     process.start()
-    loop.run_until_complete(finalyze_task(items_buffer, match_repo))
+    # save games left in the buffer
+    loop.run_until_complete(event_bus.close())
@@ -1,8 +1,31 @@
-from dataclasses import dataclass
-from typing import Union
+from dataclasses import dataclass, field
+from typing import Any, Union
 
 
 @dataclass
 class MetricRecord:
     min_value: Union[float, int]
     max_value: Union[float, int]
+
+
+@dataclass
+class BulkInsertResult:
+    inserted: int = 0
+    # duplicates of already stored records
+    skipped: int = 0
+    # existing records replaced by upsert
+    updated: int = 0
+    failed: int = 0
+    # details of failed writes, e.g. {"index": 10, "code": 121, "errmsg": "..."}
+    errors: list[dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def total(self) -> int:
+        return self.inserted + self.skipped + self.updated + self.failed
+
+    def merge(self, other: "BulkInsertResult") -> None:
+        self.inserted += other.inserted
+        self.skipped += other.skipped
+        self.updated += other.updated
+        self.failed += other.failed
+        self.errors.extend(other.errors)
@@ -8,6 +8,7 @@ import scrapy
 import scrapy.selector
 
 from domain import FootballMatch, Venue
+from event_bus import MemoryEventBus
 import repository
 import parsers.betstady_datasets as betstady_datasets
 
@@ -18,9 +19,10 @@ class MatchPipeline:
     async def process_item(
         self, item: FootballMatch, spider: "BetStadySpider"
     ) -> FootballMatch:
-        season = await spider.season_repo.insert(item.season_id)
-        event = await spider.event_repo.insert(item.event_id)
-        item.season_id, item.event_id = season.get("id"), event.get("id")
+        # ids are cached per process, so database is hit only once per name
+        item.season_id = await spider.season_repo.get_or_create(str(item.season_id))
+        item.event_id = await spider.event_repo.get_or_create(str(item.event_id))
+        await spider.event_bus.publish_one_async(item)
         return item
 
 
@@ -43,7 +45,7 @@ class BetStadySpider(scrapy.Spider):
 
     def __init__(
         self,
-        items_buffer: list,
+        event_bus: MemoryEventBus,
         pg_client: repository.PgClient,
         dataset: betstady_datasets.BetStadyDataset = None,
     ):
@@ -52,7 +54,7 @@ class BetStadySpider(scrapy.Spider):
             self.dataset = dataset
 
         self.event_name = f"{self.dataset.region}-{self.dataset.division}"
-        self.items_buffer = items_buffer
+        self.event_bus = event_bus
         self.season_repo = repository.SeasonPgRepository(pg_client)
         self.event_repo = repository.EventPgRepository(pg_client)
 
@@ -111,11 +113,11 @@ class BetStadySpider(scrapy.Spider):
                 match.team1_points, match.team2_points = self.get_teams_points(
                     match.team1_ft_score, match.team2_ft_score
                 )
-
-                self.items_buffer.append(match)
             except Exception as err:
                 logging.warning(
                     "Couldn't parse game: %s with exception: %s", game, str(err)
                 )
+                # broken games shouldn't reach the pipeline and storage
+                continue
 
             yield match
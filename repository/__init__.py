@@ -1,7 +1,10 @@
-from .mongo_repo import MatchMongoRepository
+from .mongo_repo import MatchMongoRepository, AsyncMatchMongoRepository
 from .postgresql_repo import (
     MatchPgRepository,
     SeasonPgRepository,
     EventPgRepository,
+    TeamPgRepository,
     PgClient,
 )
+from .cache import ResultCache
+from .migrations import MigrationRunner
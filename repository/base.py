@@ -3,12 +3,36 @@
 
 import atexit
 import asyncio
-from typing import Any, ClassVar, Type, Union
+import contextlib
+import itertools
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    ClassVar,
+    Iterator,
+    Optional,
+    Type,
+    Union,
+)
 
 import pymongo
 import asyncpg
 
 from config import Config
+from .migrations import Migration, MigrationRunner
+from .statements import PreparedConnection
+
+
+# routes readonly acquires of the current task to the primary pool,
+# e.g. for reads which can't tolerate replica lag
+read_from_primary: ContextVar[bool] = ContextVar("read_from_primary", default=False)
 
 
 class Connection:
@@ -50,6 +74,9 @@ class MongoClient:
         return cls._obj
 
     def __init__(self, db_config: dict):
+        if self.conn:
+            return
+
         auth_config = {}
         if db_config.get("authMechanism") == "SCRAM-SHA-1":
             auth_config["authMechanism"] = db_config["authMechanism"]
@@ -66,37 +93,66 @@ class MongoClient:
 
 
 class BaseModel(type):
+    """Metaclass of Mongo repositories.
 
-    db_session: ClassVar[pymongo.collection.Collection]
+    Connection and collection are set up on first use of db_session,
+    so importing repositories doesn't touch config or network.
+    """
+
+    collection: str
+    _db_session: Optional[pymongo.collection.Collection]
+    _lock = threading.Lock()
 
     def __new__(
         cls: Type["BaseModel"], name: str, bases: tuple[type, ...], attr: dict[str, Any]
     ) -> "BaseModel":
-        attr["client"] = MongoClient(Config()["database"])
-
-        if attr.get("capped_settings"):
-            cls.setup_capped_collection(attr)
+        attr["_db_session"] = None
+        return super().__new__(cls, name, bases, attr)
 
-        session = attr["client"].db.get_collection(
-            attr["collection"], codec_options=attr.get("codec_options")
+    @property
+    def client(cls) -> MongoClient:
+        return MongoClient(Config()["database"])
+
+    @property
+    def db_session(cls) -> pymongo.collection.Collection:
+        if cls._db_session is None:
+            # repositories may be used by several threads
+            with BaseModel._lock:
+                if cls._db_session is None:
+                    cls._db_session = cls.open_collection()
+
+        return cls._db_session
+
+    @db_session.setter
+    def db_session(cls, session: pymongo.collection.Collection) -> None:
+        cls._db_session = session
+
+    @db_session.deleter
+    def db_session(cls) -> None:
+        # collection is opened again on next use
+        cls._db_session = None
+
+    def open_collection(cls) -> pymongo.collection.Collection:
+        db = cls.client.db
+        assert db is not None
+        if getattr(cls, "capped_settings", None):
+            cls.setup_capped_collection(db)
+
+        return db.get_collection(
+            cls.collection, codec_options=getattr(cls, "codec_options", None)
         )
 
-        attr["db_session"] = session
-
-        return super().__new__(cls, name, bases, attr)
-
-    @classmethod
-    def setup_capped_collection(cls, attr: dict[str, Any]) -> None:
-        settings = attr.get("capped_settings", {})
+    def setup_capped_collection(cls, db: pymongo.database.Database) -> None:
+        settings = getattr(cls, "capped_settings", {})
         try:
-            attr["client"].db.create_collection(
-                attr["collection"],
+            db.create_collection(
+                cls.collection,
                 capped=settings["capped"],
                 size=settings["size"],
                 max=settings["max"],
             )
         except pymongo.errors.CollectionInvalid as invalid_collection:
-            stats = attr["client"].db.command("collStats", attr["collection"])
+            stats = db.command("collStats", cls.collection)
             # verifing that collection is capped
             if not stats.get("capped"):
                 raise RuntimeError(
@@ -104,8 +160,52 @@ class BaseModel(type):
                 ) from invalid_collection
 
 
+@dataclass
+class PoolStats:
+    """Usage counters of a PgClient pool."""
+
+    readonly: bool
+    max_size: int
+    acquires: int = 0
+    in_use: int = 0
+    # seconds spent waiting for a free connection
+    acquire_wait: float = 0.0
+    max_acquire_wait: float = 0.0
+    queries: int = 0
+
+    # state of the previous report, qps is measured between reports
+    reported_queries: int = 0
+    reported_at: float = field(default_factory=time.monotonic)
+
+    def report(self) -> dict[str, Any]:
+        now = time.monotonic()
+        elapsed = now - self.reported_at
+        qps = (self.queries - self.reported_queries) / elapsed if elapsed else 0.0
+        self.reported_queries, self.reported_at = self.queries, now
+
+        return {
+            "readonly": self.readonly,
+            "max_size": self.max_size,
+            "in_use": self.in_use,
+            "acquires": self.acquires,
+            "avg_acquire_wait": self.acquire_wait / self.acquires
+            if self.acquires
+            else 0.0,
+            "max_acquire_wait": self.max_acquire_wait,
+            "queries": self.queries,
+            "qps": qps,
+        }
+
+
 class PgClient:
-    """Global PostgreSQL connector"""
+    """Global PostgreSQL connector.
+
+    Besides the primary pool, config may define named pools (replicas,
+    other coordinators) under "pools", each one is a set of overrides
+    of the primary settings. Pools are readonly unless "readonly": false.
+    """
+
+    PRIMARY_POOL = "primary"
 
     conn_pool = Connection()
     db = None
@@ -124,23 +224,199 @@ class PgClient:
         self.loop = loop
         atexit.register(self.shutdown)
 
+        # __init__ runs on every call of the singleton, keep pools and subscriptions
+        if not hasattr(self, "listeners"):
+            self.listener_conn: Optional[asyncpg.Connection] = None
+            self.listeners: dict[str, list[Callable]] = defaultdict(list)
+            self.listening = False
+            self.listener_task: Optional[asyncio.Task] = None
+            self.pools: dict[str, asyncpg.Pool] = {}
+            self.pool_stats: dict[str, PoolStats] = {}
+            self.read_pools: Iterator[str] = itertools.cycle([self.PRIMARY_POOL])
+
     async def init_connection(self) -> asyncpg.Pool:
         if self.conn_pool:
             return self.conn_pool
 
-        self.conn_pool = await asyncpg.create_pool(
+        # pool connections prepare statements on init, schema has to be final
+        if self.db_config.get("migrate_on_startup"):
+            await self.migrate()
+
+        self.conn_pool = await self.create_pool(self.db_config)
+        self.pools[self.PRIMARY_POOL] = self.conn_pool
+        self.pool_stats[self.PRIMARY_POOL] = PoolStats(
+            readonly=False, max_size=self.db_config.get("max_pool_size", 10)
+        )
+
+        for name, overrides in self.db_config.get("pools", {}).items():
+            config = {**self.db_config, **overrides}
+            self.pools[name] = await self.create_pool(config)
+            self.pool_stats[name] = PoolStats(
+                readonly=config.get("readonly", True),
+                max_size=config.get("max_pool_size", 10),
+            )
+
+        # reads are spread over readonly pools, primary serves them otherwise
+        read_pools = [name for name, s in self.pool_stats.items() if s.readonly]
+        self.read_pools = itertools.cycle(read_pools or [self.PRIMARY_POOL])
+
+        return self.conn_pool
+
+    async def migrate(self) -> list[Migration]:
+        """Applies pending migrations on a dedicated connection outside of pools."""
+        con = await asyncpg.connect(
             user=self.db_config["user"],
             password=self.db_config["password"],
             database=self.db_config["database"],
             host=self.db_config["host"],
             port=self.db_config["port"],
-            max_size=10,
-            max_inactive_connection_lifetime=100,
+        )
+        try:
+            return await MigrationRunner().migrate(con)
+        finally:
+            await con.close()
+
+    async def create_pool(self, config: dict) -> asyncpg.Pool:
+        return await asyncpg.create_pool(
+            user=config["user"],
+            password=config["password"],
+            database=config["database"],
+            host=config["host"],
+            port=config["port"],
+            min_size=config.get("min_pool_size", 10),
+            max_size=config.get("max_pool_size", 10),
+            statement_cache_size=config.get("statement_cache_size", 100),
+            max_inactive_connection_lifetime=config.get(
+                "max_inactive_connection_lifetime", 100
+            ),
+            connection_class=PreparedConnection,
+            init=self.init_pool_connection,
             loop=self.loop,
         )
 
-        return self.conn_pool
+    @contextlib.asynccontextmanager
+    async def acquire(
+        self, readonly: bool = False, pool: Optional[str] = None
+    ) -> AsyncIterator[PreparedConnection]:
+        """Acquires connection of the named pool or routes by readonly flag.
+
+        Writes go to the primary pool, reads are spread over readonly pools
+        unless read_from_primary is set.
+        """
+        if readonly and not read_from_primary.get():
+            name = pool or next(self.read_pools)
+        else:
+            name = pool or self.PRIMARY_POOL
+        stats = self.pool_stats[name]
+
+        started_at = time.monotonic()
+        async with self.pools[name].acquire() as con:
+            wait = time.monotonic() - started_at
+            stats.acquires += 1
+            stats.acquire_wait += wait
+            stats.max_acquire_wait = max(stats.max_acquire_wait, wait)
+
+            stats.in_use += 1
+            queries = con.queries
+            try:
+                yield con
+            finally:
+                stats.in_use -= 1
+                stats.queries += con.queries - queries
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        """Reports usage of every pool, qps is measured since the previous report."""
+        return {name: stats.report() for name, stats in self.pool_stats.items()}
+
+    @staticmethod
+    async def init_pool_connection(con: PreparedConnection) -> None:
+        # warm up new connection with all repository statements
+        await con.prepare_all()
+
+    async def listen(
+        self, channel: str, callback: Callable[[Optional[str]], Any]
+    ) -> None:
+        """Subscribes callback to notifications of the channel.
+
+        All channels share one dedicated connection outside of the pool.
+        Lost connection is restored in background with a backoff. Callback
+        gets None when the connection is lost and once it's restored, as
+        notifications could be missed in between, listening tells which
+        one happened.
+        """
+        if not self.listening and self.listener_task is None:
+            await self._connect_listener()
+
+        if channel not in self.listeners and self.listening:
+            assert self.listener_conn is not None
+            await self.listener_conn.add_listener(channel, self._on_notification)
+
+        self.listeners[channel].append(callback)
+
+    async def _connect_listener(self) -> None:
+        con = await asyncpg.connect(
+            user=self.db_config["user"],
+            password=self.db_config["password"],
+            database=self.db_config["database"],
+            host=self.db_config["host"],
+            port=self.db_config["port"],
+        )
+        con.add_termination_listener(self._on_listener_lost)
+        for channel in self.listeners:
+            await con.add_listener(channel, self._on_notification)
+
+        self.listener_conn = con
+        self.listening = True
+
+    async def _restore_listener(self) -> None:
+        delay = self.db_config.get("listener_retry_delay", 0.5)
+        max_delay = self.db_config.get("listener_max_retry_delay", 30.0)
+        try:
+            while True:
+                await asyncio.sleep(delay)
+                try:
+                    await self._connect_listener()
+                    break
+                except (OSError, asyncpg.PostgresError) as err:
+                    logging.warning("PgClient: listener reconnect failed: %s", err)
+                    delay = min(delay * 2, max_delay)
+        finally:
+            self.listener_task = None
+
+        logging.info("PgClient: listener connection is restored.")
+        self._notify_all(None)
+
+    def _on_notification(
+        self, con: asyncpg.Connection, pid: int, channel: str, payload: str
+    ) -> None:
+        for callback in self.listeners[channel]:
+            callback(payload)
+
+    def _on_listener_lost(self, con: asyncpg.Connection) -> None:
+        logging.warning("PgClient: listener connection is lost.")
+        self.listening = False
+        self._notify_all(None)
+        if self.listener_task is None:
+            self.listener_task = asyncio.get_running_loop().create_task(
+                self._restore_listener()
+            )
+
+    def _notify_all(self, payload: Optional[str]) -> None:
+        for callbacks in self.listeners.values():
+            for callback in callbacks:
+                callback(payload)
 
     def shutdown(self) -> None:
         """Cleanup DB resources before exit."""
+        if self.listener_task:
+            self.listener_task.cancel()
+
+        if self.listener_conn and not self.listener_conn.is_closed():
+            self.listener_conn.remove_termination_listener(self._on_listener_lost)
+            self.loop.run_until_complete(self.listener_conn.close())
+
+        for name, pool in self.pools.items():
+            if name != self.PRIMARY_POOL:
+                self.loop.run_until_complete(pool.close())
+
         self.loop.run_until_complete(self.conn_pool.close())
@@ -0,0 +1,306 @@
+"""In-process caches used in front of the repositories."""
+import functools
+import inspect
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Hashable, Iterable, Optional
+
+from helpers.utils import MetricRecord
+from .base import read_from_primary
+
+
+class NameIdCache:
+    """Maps entity names to database ids.
+
+    Single instance is shared by all repositories of the same entity,
+    so the cache is process-wide.
+    """
+
+    def __init__(self) -> None:
+        self.ids: dict[str, int] = {}
+
+    @staticmethod
+    def normalize(name: str) -> str:
+        # names are stored as blank-padded CHAR
+        return name.rstrip()
+
+    def get_many(self, names: Iterable[str]) -> tuple[dict[str, int], list[str]]:
+        """Splits names to already known ids and missing names."""
+        found: dict[str, int] = {}
+        missing: dict[str, str] = {}
+        for name in names:
+            key = self.normalize(name)
+            if key in self.ids:
+                found[name] = self.ids[key]
+            elif key not in missing:
+                # original spelling is kept, it's stored for new entities
+                missing[key] = name
+
+        return found, list(missing.values())
+
+    def update(self, ids: dict[str, int]) -> None:
+        for name, _id in ids.items():
+            self.ids[self.normalize(name)] = _id
+
+    def clear(self) -> None:
+        self.ids.clear()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+class TeamNameCache(NameIdCache):
+    """Team names differing only in case and whitespace are the same team."""
+
+    @staticmethod
+    def normalize(name: str) -> str:
+        # must match normalize_team_name SQL function
+        return " ".join(name.split()).lower()
+
+
+# (event_id, season_id) pair touched by a write
+Touched = tuple[int, int]
+
+# postgres limits NOTIFY payload to 8000 bytes
+MAX_PAYLOAD_SIZE = 7900
+
+
+def pack_touched(touched: Iterable[Touched]) -> list[str]:
+    """Encodes pairs as "event:season,..." payloads, one per notification."""
+    payloads: list[str] = []
+    current: list[str] = []
+    size = 0
+    for event_id, season_id in touched:
+        item = f"{event_id}:{season_id}"
+        if current and size + len(item) + 1 > MAX_PAYLOAD_SIZE:
+            payloads.append(",".join(current))
+            current, size = [], 0
+        current.append(item)
+        size += len(item) + 1
+
+    if current:
+        payloads.append(",".join(current))
+
+    return payloads
+
+
+def unpack_touched(payload: str) -> list[Touched]:
+    pairs = (item.split(":") for item in payload.split(",") if item)
+    return [(int(event_id), int(season_id)) for event_id, season_id in pairs]
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    expires_at: float
+    size: int
+    # None means that query isn't limited by event/season
+    event_ids: Optional[frozenset]
+    season_ids: Optional[frozenset]
+
+    def is_affected(self, event_id: int, season_id: int) -> bool:
+        return (self.event_ids is None or event_id in self.event_ids) and (
+            self.season_ids is None or season_id in self.season_ids
+        )
+
+
+def estimate_size(value: Any) -> int:
+    """Rough memory usage of query result (list of records)."""
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        for row in value:
+            size += sys.getsizeof(row)
+            if isinstance(row, Iterable) and not isinstance(row, (str, bytes)):
+                size += sum(sys.getsizeof(v) for v in row)
+
+    return size
+
+
+def normalize(value: Any) -> Hashable:
+    """Makes argument usable as cache key, ids order doesn't matter."""
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(sorted(set(value)))
+    elif isinstance(value, MetricRecord):
+        return (value.min_value, value.max_value)
+
+    return value
+
+
+class ResultCache:
+    """LRU cache with TTL and memory limit for analytical query results.
+
+    Entries are tagged by event and season ids of the query and are
+    evicted precisely when games of the (event_id, season_id) change.
+    Suspended cache is bypassed, e.g. while invalidations can be missed.
+
+    Replicas may not have the changes yet, so for replica_lag seconds
+    after an invalidation results of affected queries are read from the
+    primary (see cached_query).
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: float = 3600.0,
+        max_bytes: int = 64 * 1024 * 1024,
+        clock: Callable[[], float] = time.monotonic,
+        replica_lag: float = 5.0,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.replica_lag = replica_lag
+
+        # (event_id, season_id) -> time of the last invalidation
+        self.invalidated_at: dict[Touched, float] = {}
+        self.cleared_at = float("-inf")
+
+        self.entries: OrderedDict[Hashable, CacheEntry] = OrderedDict()
+        self.size = 0
+        self.suspended = False
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def get(self, key: Hashable) -> tuple[bool, Any]:
+        entry = None if self.suspended else self.entries.get(key)
+        if entry is None or entry.expires_at <= self.clock():
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return False, None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return True, entry.value
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        event_ids: Optional[Iterable[int]] = None,
+        season_ids: Optional[Iterable[int]] = None,
+    ) -> None:
+        size = estimate_size(value)
+        if size > self.max_bytes or self.suspended:
+            return
+
+        if key in self.entries:
+            self._remove(key)
+
+        self.entries[key] = CacheEntry(
+            value,
+            self.clock() + self.ttl,
+            size,
+            frozenset(event_ids) if event_ids else None,
+            frozenset(season_ids) if season_ids else None,
+        )
+        self.size += size
+
+        while len(self.entries) > self.maxsize or self.size > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def invalidate(self, touched: Iterable[Touched]) -> int:
+        """Evicts entries affected by writes into given (event_id, season_id)."""
+        touched = list(touched)
+        now = self.clock()
+        for pair in touched:
+            self.invalidated_at[pair] = now
+        keys = [
+            key
+            for key, entry in self.entries.items()
+            if any(entry.is_affected(e, s) for e, s in touched)
+        ]
+        for key in keys:
+            self._remove(key)
+
+        self.invalidations += len(keys)
+        return len(keys)
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.size = 0
+        self.cleared_at = self.clock()
+
+    def recently_invalidated(
+        self,
+        event_ids: Optional[Iterable[int]] = None,
+        season_ids: Optional[Iterable[int]] = None,
+    ) -> bool:
+        """Checks if replicas could still miss changes of the given query."""
+        since = self.clock() - self.replica_lag
+        if self.cleared_at > since:
+            return True
+
+        self.invalidated_at = {
+            pair: at for pair, at in self.invalidated_at.items() if at > since
+        }
+        events = frozenset(event_ids) if event_ids else None
+        seasons = frozenset(season_ids) if season_ids else None
+        return any(
+            (events is None or e in events) and (seasons is None or s in seasons)
+            for e, s in self.invalidated_at
+        )
+
+    def suspend(self) -> None:
+        """Drops all entries and stops caching until resume."""
+        self.clear()
+        self.suspended = True
+
+    def resume(self) -> None:
+        self.clear()
+        self.suspended = False
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "entries": len(self.entries),
+            "bytes": self.size,
+        }
+
+    def _remove(self, key: Hashable) -> None:
+        self.size -= self.entries.pop(key).size
+
+
+def cached_query(method: Callable) -> Callable:
+    """Caches result of repository method in repository.result_cache.
+
+    Method has to accept event_ids and season_ids arguments, they are
+    used to invalidate the entry. Shortly after an invalidation misses
+    are read from the primary pool, lagging replica could refill the
+    cache with stale results otherwise.
+    """
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    async def wrapper(self: Any, *args: Any, **kwargs: Any) -> Any:
+        cache: Optional[ResultCache] = self.result_cache
+        if cache is None:
+            return await method(self, *args, **kwargs)
+
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        params = dict(bound.arguments)
+        del params["self"]
+
+        key = (method.__name__, *(normalize(v) for v in params.values()))
+        found, value = cache.get(key)
+        if not found:
+            event_ids, season_ids = params.get("event_ids"), params.get("season_ids")
+            token = read_from_primary.set(
+                cache.recently_invalidated(event_ids, season_ids)
+            )
+            try:
+                value = await method(self, *args, **kwargs)
+            finally:
+                read_from_primary.reset(token)
+            cache.set(key, value, event_ids, season_ids)
+
+        return list(value)
+
+    return wrapper
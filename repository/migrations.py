@@ -0,0 +1,110 @@
+"""Versioned schema migrations.
+
+Migrations are SQL files named <version>_<name>.sql, e.g.
+0001_game_analytical_indexes.sql. Pending files are applied in version
+order, each one in its own transaction, and recorded in schema_migrations.
+"""
+import hashlib
+import logging
+import os
+import re
+from typing import NamedTuple
+
+import asyncpg
+
+MIGRATIONS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "sql_migrations"
+)
+MIGRATION_FILE = re.compile(r"^(\d+)_(\w+)\.sql$")
+
+# any constant shared by all processes running migrations
+MIGRATIONS_LOCK_ID = 0x666F78
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    sql: str
+
+    @property
+    def checksum(self) -> str:
+        return hashlib.sha256(self.sql.encode()).hexdigest()
+
+
+def discover(directory: str = MIGRATIONS_DIR) -> list[Migration]:
+    """Loads migration files of the directory ordered by version."""
+    migrations = []
+    for filename in os.listdir(directory):
+        match = MIGRATION_FILE.match(filename)
+        if not match:
+            continue
+
+        with open(os.path.join(directory, filename)) as f:
+            migrations.append(Migration(int(match[1]), match[2], f.read()))
+
+    migrations.sort()
+    for prev, current in zip(migrations, migrations[1:]):
+        if prev.version == current.version:
+            raise ValueError(f"Migrations: duplicated version {current.version}.")
+
+    return migrations
+
+
+class MigrationRunner:
+    """Applies pending migrations, safe to run by several processes at once."""
+
+    def __init__(self, directory: str = MIGRATIONS_DIR):
+        self.migrations = discover(directory)
+
+    async def applied(self, con: asyncpg.Connection) -> dict[int, str]:
+        """Returns checksums of applied migrations by version."""
+        await con.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INT PRIMARY KEY,
+                name VARCHAR(128) NOT NULL,
+                checksum CHAR(64) NOT NULL,
+                applied_at TIMESTAMP NOT NULL DEFAULT now()
+            );
+        """
+        )
+        records = await con.fetch("SELECT version, checksum FROM schema_migrations")
+        return {r["version"]: r["checksum"] for r in records}
+
+    async def pending(self, con: asyncpg.Connection) -> list[Migration]:
+        applied = await self.applied(con)
+        for migration in self.migrations:
+            checksum = applied.get(migration.version)
+            if checksum and checksum != migration.checksum:
+                raise RuntimeError(
+                    f"Migrations: {migration.version}_{migration.name} "
+                    "was changed after it had been applied."
+                )
+
+        return [m for m in self.migrations if m.version not in applied]
+
+    async def migrate(self, con: asyncpg.Connection) -> list[Migration]:
+        """Applies pending migrations, returns the applied ones."""
+        # concurrent runners wait here and see migrations applied by the first one
+        await con.execute("SELECT pg_advisory_lock($1)", MIGRATIONS_LOCK_ID)
+        try:
+            pending = await self.pending(con)
+            for migration in pending:
+                logging.info(
+                    "Applying migration %s_%s", migration.version, migration.name
+                )
+                async with con.transaction():
+                    await con.execute(migration.sql)
+                    await con.execute(
+                        """
+                        INSERT INTO schema_migrations (version, name, checksum)
+                        VALUES ($1, $2, $3)
+                    """,
+                        migration.version,
+                        migration.name,
+                        migration.checksum,
+                    )
+        finally:
+            await con.execute("SELECT pg_advisory_unlock($1)", MIGRATIONS_LOCK_ID)
+
+        return pending
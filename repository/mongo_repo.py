@@ -1,25 +1,125 @@
 """Pymongo repository for match entity."""
+import asyncio
+import functools
+import itertools
 import json
 import logging
-from typing import Any, Optional, Type
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import fields
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Generator,
+    Iterator,
+    Mapping,
+    Optional,
+    Sequence,
+    Type,
+    TypeVar,
+    Union,
+)
 
 import pymongo.errors
 from bson.objectid import ObjectId
+from pymongo import ReplaceOne
 
 from .base import BaseModel
-from domain import FootballMatch, BaseMatch, Venue
+from domain import FootballMatch, BaseMatch, MatchBatch, Venue
+from helpers.utils import BulkInsertResult
+
+
+# fields of the unique index, they identify a match
+UNIQUE_KEY = ("date", "team1_name", "team2_name")
+
+DUPLICATE_KEY_ERROR = 11000
+
+T = TypeVar("T")
 
 
 class MatchMongoRepository(metaclass=BaseModel):
     collection = "matches"
 
+    # bulk writes are split to chunks written concurrently by workers
+    chunk_size = 1000
+    workers = 4
+
     @classmethod
     def search(cls, attr: str, value: Any) -> list[FootballMatch]:
-        if attr == "_id":
-            value = ObjectId(value)
+        return list(cls.iter_search({attr: value}))
+
+    @classmethod
+    def find(
+        cls,
+        query: Optional[Mapping[str, Any]] = None,
+        projection: Optional[Sequence[str]] = None,
+        sort: Optional[list[tuple[str, int]]] = None,
+        limit: int = 0,
+        batch_size: int = 1000,
+    ) -> pymongo.cursor.Cursor:
+        """Opens cursor over matches, query is any MongoDB filter document."""
+        query = dict(query or {})
+        if isinstance(query.get("_id"), str):
+            query["_id"] = ObjectId(query["_id"])
+
+        fields = None
+        if projection is not None:
+            unknown = set(projection) - set(FootballMatch.field_names)
+            if unknown:
+                raise ValueError(f"Unknown match fields: {sorted(unknown)}.")
+            fields = {"_id": False, **{name: True for name in projection}}
+
+        return cls.db_session.find(
+            query,
+            projection=fields,
+            sort=sort,
+            limit=limit,
+            batch_size=batch_size,
+        )
+
+    @classmethod
+    def iter_search(
+        cls,
+        query: Optional[Mapping[str, Any]] = None,
+        projection: Optional[Sequence[str]] = None,
+        sort: Optional[list[tuple[str, int]]] = None,
+        limit: int = 0,
+        batch_size: int = 1000,
+    ) -> Generator[FootballMatch, None, None]:
+        """Yields matches while documents are fetched batch by batch.
+
+        Attributes out of projection aren't set.
+        """
+        cursor = cls.find(query, projection, sort, limit, batch_size)
+        try:
+            for document in cursor:
+                yield FootballMatch.from_dict(document)
+        finally:
+            # server side cursor isn't left open when iteration stops early
+            cursor.close()
+
+    @classmethod
+    def iter_batches(
+        cls,
+        query: Optional[Mapping[str, Any]] = None,
+        sort: Optional[list[tuple[str, int]]] = None,
+        limit: int = 0,
+        batch_size: int = 10000,
+    ) -> Iterator[MatchBatch]:
+        """Yields matches as MatchBatch chunks of up to batch_size documents."""
+        documents = []
+        cursor = cls.find(query, None, sort, limit, batch_size)
+        try:
+            for document in cursor:
+                documents.append(document)
+                if len(documents) >= batch_size:
+                    yield MatchBatch.from_dicts(documents)
+                    documents = []
+        finally:
+            cursor.close()
 
-        items = cls.db_session.find({attr: value})
-        return [FootballMatch(**i) for i in items]
+        if documents:
+            yield MatchBatch.from_dicts(documents)
 
     @classmethod
     def insert(cls, m: FootballMatch) -> Optional[dict[str, Any]]:
@@ -30,9 +130,99 @@ class MatchMongoRepository(metaclass=BaseModel):
             return None
 
     @classmethod
-    def insert_many(cls, matches: list[FootballMatch]) -> dict[str, Any]:
-        to_insert = [m.as_dict() for m in matches]
-        return cls.db_session.insert_many(to_insert, ordered=False)
+    def insert_many(
+        cls,
+        matches: Union[list[FootballMatch], MatchBatch],
+        upsert: bool = False,
+        chunk_size: Optional[int] = None,
+        workers: Optional[int] = None,
+    ) -> BulkInsertResult:
+        """Writes matches in chunks by a bounded pool of threads.
+
+        Duplicates are counted as skipped, or replaced with upsert.
+        Other write errors are counted as failed and reported in the result.
+        """
+        if isinstance(matches, MatchBatch):
+            documents = list(matches.as_dicts())
+        else:
+            documents = [m.as_dict() for m in matches]
+
+        chunk_size = chunk_size or cls.chunk_size
+        write_chunk = cls._upsert_chunk if upsert else cls._insert_chunk
+        chunks = []
+        for start in range(0, len(documents), chunk_size):
+            end = start + chunk_size
+            chunks.append((documents[start:end], start))
+
+        result = BulkInsertResult()
+        with ThreadPoolExecutor(max_workers=workers or cls.workers) as executor:
+            futures = [executor.submit(write_chunk, *chunk) for chunk in chunks]
+            for future in futures:
+                result.merge(future.result())
+
+        return result
+
+    @classmethod
+    def _insert_chunk(cls, documents: list[dict], offset: int) -> BulkInsertResult:
+        try:
+            written = cls.db_session.insert_many(documents, ordered=False)
+            return BulkInsertResult(inserted=len(written.inserted_ids))
+        except pymongo.errors.BulkWriteError as err:
+            result = cls._write_errors_result(err.details, offset)
+            result.inserted = err.details["nInserted"]
+            return result
+        except pymongo.errors.PyMongoError as err:
+            logging.exception("Failed to insert %s matches.", len(documents))
+            return cls._chunk_failed_result(documents, offset, err)
+
+    @classmethod
+    def _upsert_chunk(cls, documents: list[dict], offset: int) -> BulkInsertResult:
+        requests = [
+            ReplaceOne({key: doc.get(key) for key in UNIQUE_KEY}, doc, upsert=True)
+            for doc in documents
+        ]
+        try:
+            written = cls.db_session.bulk_write(requests, ordered=False)
+            return BulkInsertResult(
+                inserted=written.upserted_count, updated=written.matched_count
+            )
+        except pymongo.errors.BulkWriteError as err:
+            result = cls._write_errors_result(err.details, offset)
+            result.inserted = err.details["nUpserted"]
+            result.updated = err.details["nMatched"]
+            return result
+        except pymongo.errors.PyMongoError as err:
+            logging.exception("Failed to upsert %s matches.", len(documents))
+            return cls._chunk_failed_result(documents, offset, err)
+
+    @staticmethod
+    def _write_errors_result(
+        details: Mapping[str, Any], offset: int
+    ) -> BulkInsertResult:
+        result = BulkInsertResult()
+        for error in details["writeErrors"]:
+            if error["code"] == DUPLICATE_KEY_ERROR:
+                result.skipped += 1
+            else:
+                result.failed += 1
+                result.errors.append(
+                    {
+                        "index": offset + error["index"],
+                        "code": error["code"],
+                        "errmsg": error["errmsg"],
+                    }
+                )
+
+        return result
+
+    @staticmethod
+    def _chunk_failed_result(
+        documents: list[dict], offset: int, err: Exception
+    ) -> BulkInsertResult:
+        return BulkInsertResult(
+            failed=len(documents),
+            errors=[{"index": offset, "code": None, "errmsg": str(err)}],
+        )
 
     @classmethod
     def delete(cls, _id: int) -> dict[str, Any]:
@@ -85,7 +275,7 @@ class MatchMongoRepository(metaclass=BaseModel):
     @classmethod
     def get_seasons_stats(
         cls, seasons: list[int], event: str, venue: Venue
-    ) -> dict[str, object]:
+    ) -> Iterator[dict[str, Any]]:
         """Performs aggregation to calculate season statistics per team."""
         match = {
             "$match": {
@@ -97,20 +287,127 @@ class MatchMongoRepository(metaclass=BaseModel):
 
     @staticmethod
     def from_file(filepath: str, domain: Type[BaseMatch]) -> list[BaseMatch]:
-        """Create list of matches from input file."""
+        """Create list of matches from input file.
+
+        Keys which aren't fields of domain (e.g. _id) are ignored,
+        invalid records are skipped.
+        """
+        names = {f.name for f in fields(domain)}
         matches = []
         with open(filepath, "r") as _file:
             data = json.load(_file)
             for match in data:
                 try:
-                    matches.append(domain(**match))
-                except ValueError as err:
-                    print(err)
+                    matches.append(
+                        domain(**{k: v for k, v in match.items() if k in names})
+                    )
+                except (TypeError, ValueError) as err:
+                    logging.warning("Skipped match from %s: %s", filepath, err)
 
         return matches
 
     @classmethod
     def create_unique_index(cls) -> list[Any]:
         return cls.db_session.create_index(
-            [("date", 1), ("team1_name", 1), ("team2_name", 1)], unique=True
+            [(key, 1) for key in UNIQUE_KEY], unique=True
         )
+
+
+class AsyncMatchMongoRepository:
+    """Asyncio facade of MatchMongoRepository.
+
+    Blocking pymongo calls are run by a thread pool, so the event loop
+    isn't stalled by network round trips.
+    """
+
+    def __init__(
+        self,
+        repository: Type[MatchMongoRepository] = MatchMongoRepository,
+        max_workers: Optional[int] = None,
+    ):
+        self.repository = repository
+        self.executor = ThreadPoolExecutor(max_workers)
+
+    async def _run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(func, *args, **kwargs)
+        )
+
+    async def search(self, attr: str, value: Any) -> list[FootballMatch]:
+        return await self._run(self.repository.search, attr, value)
+
+    async def iter_search(
+        self,
+        query: Optional[Mapping[str, Any]] = None,
+        projection: Optional[Sequence[str]] = None,
+        sort: Optional[list[tuple[str, int]]] = None,
+        limit: int = 0,
+        batch_size: int = 1000,
+    ) -> AsyncIterator[FootballMatch]:
+        """Streams matches, each batch of documents is fetched by a worker thread.
+
+        Cursor is closed by a worker thread as well, also when the
+        iteration stops early.
+        """
+        matches = self.repository.iter_search(
+            query, projection, sort, limit, batch_size
+        )
+        fetch: Optional["Future[list[FootballMatch]]"] = None
+
+        def close() -> None:
+            # generator can't be closed while a fetch is running
+            if fetch is not None:
+                wait([fetch])
+            matches.close()
+
+        try:
+            while True:
+                fetch = self.executor.submit(
+                    list, itertools.islice(matches, batch_size)
+                )
+                chunk = await asyncio.wrap_future(fetch)
+                for match in chunk:
+                    yield match
+
+                if len(chunk) < batch_size:
+                    return
+        finally:
+            await self._run(close)
+
+    async def insert(self, m: FootballMatch) -> Optional[dict[str, Any]]:
+        return await self._run(self.repository.insert, m)
+
+    async def insert_many(
+        self,
+        matches: Union[list[FootballMatch], MatchBatch],
+        upsert: bool = False,
+        chunk_size: Optional[int] = None,
+        workers: Optional[int] = None,
+    ) -> BulkInsertResult:
+        return await self._run(
+            self.repository.insert_many, matches, upsert, chunk_size, workers
+        )
+
+    async def delete(self, _id: int) -> dict[str, Any]:
+        return await self._run(self.repository.delete, _id)
+
+    async def get_seasons_stats(
+        self, seasons: list[int], event: str, venue: Venue
+    ) -> list[dict[str, Any]]:
+        # aggregation cursor is drained by the worker thread as well
+        def fetch() -> list[dict[str, Any]]:
+            return list(self.repository.get_seasons_stats(seasons, event, venue))
+
+        return await self._run(fetch)
+
+    async def create_unique_index(self) -> list[Any]:
+        return await self._run(self.repository.create_unique_index)
+
+    def close(self) -> None:
+        """Waits for running calls, blocks the caller."""
+        self.executor.shutdown(wait=True)
+
+    async def aclose(self) -> None:
+        """Waits for running calls without blocking the event loop."""
+        await asyncio.to_thread(self.executor.shutdown, wait=True)
@@ -1,57 +1,713 @@
 """PostgreSQL to Python mapper with asyncio support."""
 
-from typing import Any, Optional
+import math
+import time
+from datetime import date, datetime
+from typing import Any, AsyncIterator, ClassVar, Mapping, Optional, Sequence, Union
+import itertools
+
 import asyncpg
 
-from domain import FootballMatch
+from domain import FootballMatch, MatchBatch, ScoreDistribution
 from .base import PgClient
-from helpers.utils import MetricRecord
+from .cache import (
+    NameIdCache,
+    ResultCache,
+    TeamNameCache,
+    Touched,
+    cached_query,
+    pack_touched,
+    unpack_touched,
+)
+from .statements import statements
+from helpers.utils import MetricRecord, BulkInsertResult
+
+
+# notifies about (event_id, season_id) pairs with new games
+GAME_CHANGES_CHANNEL = "game_changes"
+
+# held shared by game writers, columnar sync takes it exclusively
+# to wait for in-flight inserts before picking the id watermark
+COLUMNAR_SYNC_LOCK_ID = 0x666F79
+
+# tables get_stats can read from
+ROW_SOURCE, COLUMNAR_SOURCE = "game", "game_columnar"
+
+# columns copied from game to game_columnar
+GAME_COLUMNS = """
+    id, home_team_id, away_team_id, event_id, season_id, date,
+    home_team_xg, away_team_xg, home_team_score, away_team_score,
+    home_team_shots, away_team_shots, home_team_corners, away_team_corners,
+    home_team_points, away_team_points
+"""
+
+GAME_INSERT_COLUMNS = (
+    "home_team_id",
+    "away_team_id",
+    "date",
+    "event_id",
+    "season_id",
+    "home_team_score",
+    "away_team_score",
+    "home_team_points",
+    "away_team_points",
+    "home_team_xg",
+    "away_team_xg",
+)
+
+# FootballMatch attributes in GAME_INSERT_COLUMNS order, names are replaced with ids
+MATCH_INSERT_FIELDS = (
+    "team1_name",
+    "team2_name",
+    "date",
+    "event_id",
+    "season_id",
+    "team1_ft_score",
+    "team2_ft_score",
+    "team1_points",
+    "team2_points",
+    "team_1xg",
+    "team_2xg",
+)
+
+# game column -> FootballMatch attribute, for rows read as matches
+GAME_MATCH_FIELDS = {
+    "home_team": "team1_name",
+    "away_team": "team2_name",
+    "date": "date",
+    "event_id": "event_id",
+    "season_id": "season_id",
+    "home_team_score": "team1_ft_score",
+    "away_team_score": "team2_ft_score",
+    "home_team_points": "team1_points",
+    "away_team_points": "team2_points",
+    "home_team_xg": "team_1xg",
+    "away_team_xg": "team_2xg",
+}
+
+# columns which can be projected by streaming reads,
+# home_team and away_team are names joined from the team table
+GAME_READ_COLUMNS = (
+    "id",
+    *GAME_MATCH_FIELDS,
+    "home_team_id",
+    "away_team_id",
+    "home_team_shots",
+    "away_team_shots",
+    "home_team_corners",
+    "away_team_corners",
+)
+
+
+def projection(columns: Sequence[str]) -> str:
+    """Builds SELECT list of whitelisted game columns."""
+    unknown = set(columns) - set(GAME_READ_COLUMNS)
+    if unknown or not columns:
+        raise ValueError(f"Unknown game columns: {sorted(unknown) or columns}.")
+
+    joined = {"home_team": "h.name AS home_team", "away_team": "a.name AS away_team"}
+    return ", ".join(joined.get(c, f"g.{c}") for c in columns)
+
+
+def quote_ident(name: str) -> str:
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+def nan_to_null(value: Any) -> Any:
+    """Missing floats of a MatchBatch are NaN, they're stored as NULL."""
+    if type(value) is float and math.isnan(value):
+        return None
+
+    return value
+
+
+def game_row_to_match(row: Mapping[str, Any]) -> FootballMatch:
+    """Converts game row (or its projection) to a match, other columns are skipped."""
+    values = {}
+    for column, value in row.items():
+        name = GAME_MATCH_FIELDS.get(column)
+        if name == "date" and type(value) is date:
+            value = datetime.combine(value, datetime.min.time())
+
+        if name:
+            values[name] = value
+
+    return FootballMatch(**values)
+
+
+# per team and venue totals of games from the given relation,
+# used to maintain team_season_stats
+TEAM_SEASON_STATS_SELECT = """
+    SELECT home_team_id AS team_id, event_id, season_id, 'home' AS venue,
+        count(*) AS games, sum(home_team_points) AS points,
+        sum(home_team_score) AS goals_for, sum(away_team_score) AS goals_against,
+        sum(home_team_xg) AS xg_for, sum(away_team_xg) AS xg_against
+    FROM {source} GROUP BY home_team_id, event_id, season_id
+
+    UNION ALL
+
+    SELECT away_team_id AS team_id, event_id, season_id, 'away' AS venue,
+        count(*) AS games, sum(away_team_points) AS points,
+        sum(away_team_score) AS goals_for, sum(home_team_score) AS goals_against,
+        sum(away_team_xg) AS xg_for, sum(home_team_xg) AS xg_against
+    FROM {source} GROUP BY away_team_id, event_id, season_id
+"""
+
+
+statements.register(
+    "game.get_by_event",
+    """
+    SELECT g.*, h.name AS home_team, a.name AS away_team FROM game g
+    LEFT JOIN team h ON h.id = g.home_team_id
+    LEFT JOIN team a ON a.id = g.away_team_id
+    WHERE g.event_id = $1
+    """,
+)
+
+statements.register(
+    "game.get_by_points",
+    """
+    SELECT team, score_per_game, conceded_per_game, points_per_game
+    FROM multi_season_table($3, $4)
+    WHERE points_per_game <= $2 AND points_per_game >= $1;
+    """,
+)
+
+statements.register(
+    "game.get_by_score",
+    """
+    SELECT team, score_per_game, conceded_per_game, points_per_game
+    FROM multi_season_table($1, $2)
+    WHERE (score_per_game <= $4 AND score_per_game >= $3)
+        AND (conceded_per_game <= $6 AND conceded_per_game >= $5);
+    """,
+)
+
+statements.register(
+    "game.get_by_league_pos",
+    """
+    SELECT * FROM
+    (SELECT team, points,
+        ROW_NUMBER () OVER (PARTITION BY season_id
+                            ORDER BY points DESC)
+        AS league_position FROM season_table($1, $2)
+    ) as q
+    WHERE league_position >= $3 AND league_position <= $4;
+    """,
+)
+
+
+statements.register(
+    "game.columnar_lag",
+    """
+    SELECT coalesce(s.last_id, 0) AS synced_id, g.latest_id,
+        (SELECT count(*) FROM game WHERE id > coalesce(s.last_id, 0)) AS pending_games,
+        s.synced_at, now() - s.synced_at AS since_sync
+    FROM (SELECT coalesce(max(id), 0) AS latest_id FROM game) g
+    LEFT JOIN columnar_sync s ON s.source = 'game';
+    """,
+)
+
+
+def filters_condition(filters: tuple[bool, ...]) -> str:
+    """Builds WHERE condition for given set of (event, season, home, away) filters."""
+    conditions = (
+        # same type as partition key, so that partitions are pruned
+        ("event_id = ANY(${}::bigint[])", "event_id IS NOT NULL"),
+        ("season_id = ANY(${}::bigint[])", "season_id IS NOT NULL"),
+        # teams are filtered by names, any alias resolves to the team
+        (
+            "home_team_id = ANY(ARRAY(SELECT team_ids(${}::varchar[])))",
+            "home_team_id IS NOT NULL",
+        ),
+        (
+            "away_team_id = ANY(ARRAY(SELECT team_ids(${}::varchar[])))",
+            "away_team_id IS NOT NULL",
+        ),
+    )
+
+    where, args_count = [], 0
+    for enabled, (condition, no_filter) in zip(filters, conditions):
+        if enabled:
+            args_count += 1
+            where.append(condition.format(args_count))
+        else:
+            where.append(no_filter)
+
+    return " AND ".join(where)
+
+
+def stats_query(filters: tuple[bool, ...], source: str = ROW_SOURCE) -> str:
+    # only columns of the team indexes are read, so team filtered
+    # stats are served by index only scans
+    return """SELECT avg(away_team_points) AS away_points,
+           avg(home_team_points) AS home_points,
+           count(*) AS total_games,
+           avg(away_team_score) AS away_goals,
+           avg(home_team_score) AS home_goals,
+           avg(home_team_score) + avg(away_team_score) AS goals_per_game,
+
+           count(*) FILTER (WHERE away_team_score + home_team_score > 2.5) / cast(count(*) AS decimal) AS over2_5,
+           count(*) FILTER (WHERE away_team_score + home_team_score > 3.5) / cast(count(*) AS decimal) AS over3_5,
+           count(*) FILTER (WHERE away_team_score > 0 AND home_team_score > 0) / cast(count(*) AS decimal) AS btts,
+
+           count(*) FILTER (WHERE away_team_score > home_team_score) / cast(count(*) AS decimal) AS away_win,
+           count(*) FILTER (WHERE away_team_score < home_team_score) / cast(count(*) AS decimal) AS home_win,
+           count(*) FILTER (WHERE away_team_score = home_team_score) / cast(count(*) AS decimal) AS draw
+    from {0} where {1};""".format(source, filters_condition(filters))
+
+
+def score_histogram_query(filters: tuple[bool, ...], source: str = ROW_SOURCE) -> str:
+    return """SELECT home_team_score, away_team_score, count(*) AS games
+    FROM {0} WHERE {1}
+        AND home_team_score IS NOT NULL AND away_team_score IS NOT NULL
+    GROUP BY home_team_score, away_team_score;""".format(
+        source, filters_condition(filters)
+    )
+
+
+STATS_STATEMENTS = {
+    (source, filters): statements.register(
+        "{}.get_stats.{}".format(source, "".join(str(int(f)) for f in filters)),
+        stats_query(filters, source),
+    )
+    for source in (ROW_SOURCE, COLUMNAR_SOURCE)
+    for filters in itertools.product((False, True), repeat=4)
+}
+
+SCORE_HISTOGRAM_STATEMENTS = {
+    (source, filters): statements.register(
+        "{}.get_score_histogram.{}".format(
+            source, "".join(str(int(f)) for f in filters)
+        ),
+        score_histogram_query(filters, source),
+    )
+    for source in (ROW_SOURCE, COLUMNAR_SOURCE)
+    for filters in itertools.product((False, True), repeat=4)
+}
 
 
 class MatchPgRepository:
-    def __init__(self, pg_client: PgClient):
+    # batches of this size and above are streamed with binary COPY,
+    # smaller ones are staged with a regular executemany
+    copy_threshold = 500
+
+    # seasons known to have a game partition, shared by the process,
+    # seasons are forgotten on detach and on notifications about them
+    partitions: ClassVar[set[int]] = set()
+
+    def __init__(
+        self,
+        pg_client: PgClient,
+        result_cache: Optional[ResultCache] = None,
+        columnar_reads: bool = False,
+    ):
+        """
+        With columnar_reads full scan aggregates (get_stats) read
+        game_columnar, which lags behind game until sync_columnar
+        is called, see columnar_lag.
+        """
         self.client = pg_client
+        self.result_cache = result_cache
+        self.stats_source = COLUMNAR_SOURCE if columnar_reads else ROW_SOURCE
+        self.teams = TeamPgRepository(pg_client)
+
+    async def insert_many(
+        self, matches: Union[list[FootballMatch], MatchBatch]
+    ) -> BulkInsertResult:
+        """Bulk ingest of matches into the game table.
+
+        Rows are staged in a temporary table and merged into game with
+        a single set-based upsert, duplicated games are skipped.
+        """
+        if not len(matches):
+            return BulkInsertResult()
+
+        records: list[tuple]
+        if isinstance(matches, MatchBatch):
+            records = list(matches.iter_tuples(MATCH_INSERT_FIELDS))
+        else:
+            records = list(map(FootballMatch.row_getter(*MATCH_INSERT_FIELDS), matches))
+
+        season_pos = MATCH_INSERT_FIELDS.index("season_id")
+        await self.ensure_partitions({r[season_pos] for r in records})
+
+        team_ids = await self.teams.get_or_create_many(
+            list({name for r in records for name in r[:2]})
+        )
+        records = [
+            (team_ids[r[0]], team_ids[r[1]], *map(nan_to_null, r[2:])) for r in records
+        ]
+
+        async with self.client.acquire() as con:
+            async with con.transaction():
+                await con.execute(
+                    "SELECT pg_advisory_xact_lock_shared($1);", COLUMNAR_SYNC_LOCK_ID
+                )
+                await self._create_staging_table(con)
+                if len(records) >= self.copy_threshold:
+                    await con.copy_records_to_table(
+                        "game_staging", records=records, columns=GAME_INSERT_COLUMNS
+                    )
+                else:
+                    await con.executemany(
+                        """
+                        INSERT INTO game_staging (
+                            home_team_id, away_team_id, date, event_id, season_id,
+                            home_team_score, away_team_score,
+                            home_team_points, away_team_points,
+                            home_team_xg, away_team_xg
+                        ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11)
+                    """,
+                        records,
+                    )
+
+                touched = await self._merge_staging_table(con)
+                await self._notify_changes(con, touched)
 
-    async def insert_many(self, matches: list[FootballMatch]) -> None:
-        if not matches:
+        if self.result_cache:
+            self.result_cache.invalidate(touched)
+
+        inserted = sum(touched.values())
+        return BulkInsertResult(inserted=inserted, skipped=len(records) - inserted)
+
+    async def ensure_partitions(self, season_ids: set[int]) -> None:
+        """Creates game partitions for new seasons.
+
+        Runs in its own short transaction, as partition creation locks
+        the whole game table.
+        """
+        missing = [int(s) for s in season_ids if s not in self.partitions]
+        if not missing:
             return
 
-        input = (
-            (
-                m.team1_name,
-                m.team2_name,
-                m.date,
-                m.event_id,
-                m.season_id,
-                m.team1_ft_score,
-                m.team2_ft_score,
-                m.team1_points,
-                m.team2_points,
+        async with self.client.acquire() as con:
+            await con.execute(
+                "SELECT ensure_game_partition(s) FROM unnest($1::bigint[]) s;",
+                missing,
             )
-            for m in matches
+
+        self.partitions.update(missing)
+
+    async def detach_season(
+        self, season_id: int, archive_schema: Optional[str] = None
+    ) -> None:
+        """Removes season partition from game without copying rows.
+
+        Partition is kept as a standalone game_season_<id>_detached_<unix time>
+        table, moved to archive_schema when given, so the season can get
+        a new partition. Season totals are removed from team_season_stats,
+        so aggregates match the remaining games.
+        """
+        partition = f"game_season_{int(season_id)}"
+        detached = f"{partition}_detached_{int(time.time())}"
+        async with self.client.acquire() as con:
+            async with con.transaction():
+                await con.execute(f"ALTER TABLE game DETACH PARTITION {partition};")
+                await con.execute(f"ALTER TABLE {partition} RENAME TO {detached};")
+                if archive_schema:
+                    schema = quote_ident(archive_schema)
+                    await con.execute(
+                        f"CREATE SCHEMA IF NOT EXISTS {schema};"
+                        f"ALTER TABLE {detached} SET SCHEMA {schema};"
+                    )
+                records = await con.fetch(
+                    """
+                    DELETE FROM team_season_stats WHERE season_id = $1
+                    RETURNING event_id, season_id;
+                """,
+                    season_id,
+                )
+                touched = {(r["event_id"], r["season_id"]): 0 for r in records}
+                await self._notify_changes(con, touched)
+
+        self.partitions.discard(season_id)
+        if self.result_cache:
+            self.result_cache.invalidate(touched)
+
+    async def _create_staging_table(self, con: asyncpg.Connection) -> None:
+        await con.execute(
+            """
+            CREATE TEMPORARY TABLE game_staging (
+                home_team_id BIGINT,
+                away_team_id BIGINT,
+                date DATE,
+                event_id BIGINT,
+                season_id BIGINT,
+                home_team_score INT,
+                away_team_score INT,
+                home_team_points INT,
+                away_team_points INT,
+                home_team_xg FLOAT,
+                away_team_xg FLOAT
+            ) ON COMMIT DROP;
+        """
         )
 
-        async with self.client.conn_pool.acquire() as con:
-            return await con.executemany(
-                """
+    async def _merge_staging_table(
+        self, con: asyncpg.Connection
+    ) -> dict[Touched, int]:
+        """Moves staged rows into game and adds them to team_season_stats.
+
+        Returns number of inserted games per (event_id, season_id).
+        """
+        records = await con.fetch(
+            """
+            WITH inserted AS (
                 INSERT INTO game (
-                    home_team, away_team, date, event_id, season_id,
+                    home_team_id, away_team_id, date, event_id, season_id,
                     home_team_score, away_team_score,
-                    home_team_points, away_team_points
-                ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9) ON CONFLICT DO NOTHING
-            """,
-                input,
+                    home_team_points, away_team_points,
+                    home_team_xg, away_team_xg
+                )
+                SELECT home_team_id, away_team_id, date, event_id, season_id,
+                    home_team_score, away_team_score,
+                    home_team_points, away_team_points,
+                    home_team_xg, away_team_xg
+                FROM game_staging
+                ON CONFLICT DO NOTHING
+                RETURNING *
+            ), stats AS (
+                INSERT INTO team_season_stats AS t (
+                    team_id, event_id, season_id, venue, games, points,
+                    goals_for, goals_against, xg_for, xg_against
+                )
+                {0}
+                ON CONFLICT (team_id, event_id, season_id, venue) DO UPDATE SET
+                    games = t.games + excluded.games,
+                    points = t.points + excluded.points,
+                    goals_for = t.goals_for + excluded.goals_for,
+                    goals_against = t.goals_against + excluded.goals_against,
+                    xg_for = coalesce(t.xg_for, 0) + coalesce(excluded.xg_for, 0),
+                    xg_against = coalesce(t.xg_against, 0) + coalesce(excluded.xg_against, 0)
+            )
+            SELECT event_id, season_id, count(*) AS games FROM inserted
+            GROUP BY event_id, season_id;
+        """.format(
+                TEAM_SEASON_STATS_SELECT.format(source="inserted")
             )
+        )
+        return {(r["event_id"], r["season_id"]): r["games"] for r in records}
 
-    async def get_by_event(self, event_id: int) -> list[asyncpg.Record]:
-        async with self.client.conn_pool.acquire() as con:
-            return await con.fetch(
+    async def rebuild_team_season_stats(self) -> None:
+        """Recomputes team_season_stats from scratch, e.g. after manual edits of game.
+
+        Results cached by other processes are invalidated as well.
+        """
+        async with self.client.acquire() as con:
+            async with con.transaction():
+                # writers wait until the rebuild is committed
+                await con.execute("LOCK TABLE game IN SHARE MODE;")
+                records = await con.fetch(
+                    """
+                    SELECT event_id, season_id FROM team_season_stats
+                    UNION SELECT event_id, season_id FROM game;
                 """
-                SELECT * FROM game WHERE event_id = $1
-            """,
-                event_id,
+                )
+                await con.execute("TRUNCATE team_season_stats;")
+                await con.execute(
+                    """
+                    INSERT INTO team_season_stats (
+                        team_id, event_id, season_id, venue, games, points,
+                        goals_for, goals_against, xg_for, xg_against
+                    )
+                    {0};
+                """.format(
+                        TEAM_SEASON_STATS_SELECT.format(source="game")
+                    )
+                )
+                touched = {(r["event_id"], r["season_id"]): 0 for r in records}
+                await self._notify_changes(con, touched)
+
+        if self.result_cache:
+            self.result_cache.invalidate(touched)
+
+    async def _notify_changes(
+        self, con: asyncpg.Connection, touched: dict[Touched, int]
+    ) -> None:
+        # notifications are delivered to other processes on commit
+        for payload in pack_touched(touched):
+            await con.execute(
+                "SELECT pg_notify($1, $2);", GAME_CHANGES_CHANNEL, payload
             )
 
+    async def sync_columnar(self) -> int:
+        """Copies games inserted since the last sync into game_columnar.
+
+        Returns number of copied games. Columnar storage prefers large
+        batches, so call it periodically rather than after every insert.
+        """
+        async with self.client.acquire() as con:
+            # ids up to the watermark are committed once in-flight writers are done
+            await con.execute("SELECT pg_advisory_lock($1);", COLUMNAR_SYNC_LOCK_ID)
+            try:
+                watermark = await con.fetchval("SELECT coalesce(max(id), 0) FROM game;")
+            finally:
+                await con.execute(
+                    "SELECT pg_advisory_unlock($1);", COLUMNAR_SYNC_LOCK_ID
+                )
+
+            async with con.transaction():
+                # row is missing when columnar_sync was truncated or never seeded
+                await con.execute(
+                    """
+                    INSERT INTO columnar_sync (source, last_id) VALUES ('game', 0)
+                    ON CONFLICT DO NOTHING;
+                """
+                )
+                synced_id = await con.fetchval(
+                    "SELECT last_id FROM columnar_sync WHERE source = 'game' FOR UPDATE;"
+                )
+                records = await con.fetch(
+                    """
+                    WITH copied AS (
+                        INSERT INTO game_columnar ({0})
+                        SELECT {0} FROM game WHERE id > $1 AND id <= $2
+                        RETURNING event_id, season_id
+                    )
+                    SELECT event_id, season_id, count(*) AS games FROM copied
+                    GROUP BY event_id, season_id;
+                """.format(
+                        GAME_COLUMNS
+                    ),
+                    synced_id,
+                    watermark,
+                )
+                await con.execute(
+                    """
+                    UPDATE columnar_sync SET last_id = $1, synced_at = now()
+                    WHERE source = 'game' AND last_id < $1;
+                """,
+                    watermark,
+                )
+                touched = {(r["event_id"], r["season_id"]): r["games"] for r in records}
+                await self._notify_changes(con, touched)
+
+        if self.result_cache:
+            self.result_cache.invalidate(touched)
+
+        return sum(touched.values())
+
+    async def columnar_lag(self) -> asyncpg.Record:
+        """Returns synced_id, latest_id, pending_games, synced_at and since_sync."""
+        async with self.client.acquire() as con:
+            return await con.fetchrow_prepared("game.columnar_lag")
+
+    async def subscribe_invalidations(self) -> None:
+        """Evicts cached results and known partitions when other processes
+        write games.
+
+        Cache is bypassed while the listener connection is down.
+        """
+        await self.client.listen(GAME_CHANGES_CHANNEL, self._on_game_changes)
+        if self.result_cache and not self.client.listening:
+            self.result_cache.suspend()
+
+    def _on_game_changes(self, payload: Optional[str]) -> None:
+        touched = unpack_touched(payload) if payload else []
+        # partition could be detached, it's checked again on next insert
+        if payload is None:
+            self.partitions.clear()
+        else:
+            self.partitions.difference_update(s for _, s in touched)
+
+        if not self.result_cache:
+            return
+
+        if payload is None:
+            # notifications could be missed, nothing in the cache is reliable
+            if self.client.listening:
+                self.result_cache.resume()
+            else:
+                self.result_cache.suspend()
+        else:
+            self.result_cache.invalidate(touched)
+
+    async def get_by_event(self, event_id: int) -> list[asyncpg.Record]:
+        async with self.client.acquire(readonly=True) as con:
+            return await con.fetch_prepared("game.get_by_event", event_id)
+
+    async def iter_games(
+        self,
+        event_ids: Optional[list[int]] = None,
+        season_ids: Optional[list[int]] = None,
+        home_teams: Optional[list[str]] = None,
+        away_teams: Optional[list[str]] = None,
+        columns: Sequence[str] = GAME_READ_COLUMNS,
+        prefetch: int = 1000,
+    ) -> AsyncIterator[asyncpg.Record]:
+        """Streams game rows with a server-side cursor.
+
+        Only prefetch rows are kept in memory. Pool connection is held
+        until the iteration is finished or the iterator is closed.
+        """
+        filters = (event_ids, season_ids, home_teams, away_teams)
+        query = """
+            SELECT {0} FROM game g
+            LEFT JOIN team h ON h.id = g.home_team_id
+            LEFT JOIN team a ON a.id = g.away_team_id
+            WHERE {1};
+        """.format(
+            projection(columns), filters_condition(tuple(bool(f) for f in filters))
+        )
+        async with self.client.acquire(readonly=True) as con:
+            # cursors live inside a transaction only
+            async with con.transaction():
+                cursor = con.cursor(
+                    query, *(f for f in filters if f), prefetch=prefetch
+                )
+                async for record in cursor:
+                    yield record
+
+    async def iter_by_event(
+        self,
+        event_id: int,
+        columns: Sequence[str] = GAME_READ_COLUMNS,
+        prefetch: int = 1000,
+    ) -> AsyncIterator[asyncpg.Record]:
+        """Streaming version of get_by_event."""
+        async for record in self.iter_games(
+            [event_id], columns=columns, prefetch=prefetch
+        ):
+            yield record
+
+    async def iter_matches(
+        self,
+        event_ids: Optional[list[int]] = None,
+        season_ids: Optional[list[int]] = None,
+        columns: Sequence[str] = tuple(GAME_MATCH_FIELDS),
+        prefetch: int = 1000,
+    ) -> AsyncIterator[FootballMatch]:
+        """Streams games as matches, attributes out of columns aren't set."""
+        async for record in self.iter_games(
+            event_ids, season_ids, columns=columns, prefetch=prefetch
+        ):
+            yield game_row_to_match(record)
+
+    async def iter_batches(
+        self,
+        event_ids: Optional[list[int]] = None,
+        season_ids: Optional[list[int]] = None,
+        batch_size: int = 10000,
+    ) -> AsyncIterator[MatchBatch]:
+        """Streams games as MatchBatch chunks of up to batch_size matches.
+
+        Columns which aren't stored in game (e.g. group) hold missing values.
+        """
+        names = list(GAME_MATCH_FIELDS.values())
+        rows = []
+        async for record in self.iter_games(
+            event_ids, season_ids, columns=tuple(GAME_MATCH_FIELDS), prefetch=batch_size
+        ):
+            rows.append(tuple(record))
+            if len(rows) >= batch_size:
+                yield MatchBatch.from_rows(rows, names)
+                rows = []
+
+        if rows:
+            yield MatchBatch.from_rows(rows, names)
+
+    @cached_query
     async def get_by_points(
         self,
         event_ids: list[int],
@@ -61,19 +717,16 @@ class MatchPgRepository:
         """
         Finds teams withing given points per game range.
         """
-        async with self.client.conn_pool.acquire() as con:
-            return await con.fetch(
-                """
-                SELECT team, score_per_game, conceded_per_game, points_per_game
-                FROM multi_season_table($3, $4)
-                WHERE points_per_game <= $2 AND points_per_game >= $1;
-            """,
+        async with self.client.acquire(readonly=True) as con:
+            return await con.fetch_prepared(
+                "game.get_by_points",
                 points.min_value,
                 points.max_value,
                 event_ids,
                 season_ids,
             )
 
+    @cached_query
     async def get_by_score(
         self,
         event_ids: list[int],
@@ -81,14 +734,9 @@ class MatchPgRepository:
         score: MetricRecord,
         conceded: MetricRecord,
     ) -> list[asyncpg.Record]:
-        async with self.client.conn_pool.acquire() as con:
-            return await con.fetch(
-                """
-                SELECT team, score_per_game, conceded_per_game, points_per_game
-                FROM multi_season_table($1, $2)
-                WHERE (score_per_game <= $4 AND score_per_game >= $3)
-                    AND (conceded_per_game <= $6 AND conceded_per_game >= $5);
-            """,
+        async with self.client.acquire(readonly=True) as con:
+            return await con.fetch_prepared(
+                "game.get_by_score",
                 event_ids,
                 season_ids,
                 score.min_value,
@@ -97,27 +745,20 @@ class MatchPgRepository:
                 conceded.max_value,
             )
 
+    @cached_query
     async def get_by_league_pos(
         self, event_ids: list[int], season_ids: list[int], position: MetricRecord
     ) -> list[asyncpg.Record]:
-        async with self.client.conn_pool.acquire() as con:
-            return await con.fetch(
-                """
-                SELECT * FROM
-                (SELECT team, points,
-                    ROW_NUMBER () OVER (PARTITION BY season_id
-                                        ORDER BY points DESC)
-                    AS league_position FROM season_table($1, $2)
-                ) as q
-                WHERE league_position >= $3 AND league_position <= $4;
-
-            """,
+        async with self.client.acquire(readonly=True) as con:
+            return await con.fetch_prepared(
+                "game.get_by_league_pos",
                 event_ids,
                 season_ids,
                 position.min_value,
                 position.max_value,
             )
 
+    @cached_query
     async def get_stats(
         self,
         event_ids: Optional[list[int]] = None,
@@ -125,56 +766,44 @@ class MatchPgRepository:
         home_teams: Optional[list[str]] = None,
         away_teams: Optional[list[str]] = None,
     ) -> list[asyncpg.Record]:
-        async with self.client.conn_pool.acquire() as con:
-            base_query = """SELECT avg(away_team_points) AS away_points,
-                       avg(home_team_points) AS home_points,
-                       count(*) AS total_games,
-                       avg(away_team_score) AS away_goals,
-                       avg(home_team_score) AS home_goals,
-                       avg(home_team_score) + avg(away_team_score) AS goals_per_game,
-
-                       count(id) FILTER (WHERE away_team_score + home_team_score > 2.5) / cast(count(*) AS decimal) AS over2_5,
-                       count(id) FILTER (WHERE away_team_score + home_team_score > 3.5) / cast(count(*) AS decimal) AS over3_5,
-                       count(id) FILTER (WHERE away_team_score > 0 AND home_team_score > 0) / cast(count(*) AS decimal) AS btts,
-
-                       count(id) FILTER (WHERE away_team_score > home_team_score) / cast(count(*) AS decimal) AS away_win,
-                       count(id) FILTER (WHERE away_team_score < home_team_score) / cast(count(*) AS decimal) AS home_win,
-                       count(id) FILTER (WHERE away_team_score = home_team_score) / cast(count(*) AS decimal) AS draw
-                from game where {0} AND {1} AND {2} AND {3};"""
-
-            args: list[Any] = []
-            if event_ids:
-                args.append(event_ids)
-                event_where = f"event_id = ANY(${len(args)}::int[])"
-            else:
-                event_where = "event_id IS NOT NULL"
+        # every combination of filters has own prepared statement
+        filters = (event_ids, season_ids, home_teams, away_teams)
+        name = STATS_STATEMENTS[self.stats_source, tuple(bool(f) for f in filters)]
+        async with self.client.acquire(readonly=True) as con:
+            return await con.fetch_prepared(name, *(f for f in filters if f))
 
-            if season_ids:
-                args.append(season_ids)
-                season_where = f"season_id = ANY(${len(args)}::int[])"
-            else:
-                season_where = "season_id IS NOT NULL"
-
-            if home_teams:
-                args.append(home_teams)
-                home_teams_where = f"home_team = ANY(${len(args)}::varchar[])"
-            else:
-                home_teams_where = "home_team IS NOT NULL"
-
-            if away_teams:
-                args.append(away_teams)
-                away_teams_where = f"away_team = ANY(${len(args)}::varchar[])"
-            else:
-                away_teams_where = "away_team IS NOT NULL"
+    @cached_query
+    async def get_score_histogram(
+        self,
+        event_ids: Optional[list[int]] = None,
+        season_ids: Optional[list[int]] = None,
+        home_teams: Optional[list[str]] = None,
+        away_teams: Optional[list[str]] = None,
+    ) -> list[asyncpg.Record]:
+        """Returns (home_team_score, away_team_score, games) of filtered games."""
+        filters = (event_ids, season_ids, home_teams, away_teams)
+        name = SCORE_HISTOGRAM_STATEMENTS[
+            self.stats_source, tuple(bool(f) for f in filters)
+        ]
+        async with self.client.acquire(readonly=True) as con:
+            return await con.fetch_prepared(name, *(f for f in filters if f))
 
-            final_query = base_query.format(
-                event_where, season_where, home_teams_where, away_teams_where
-            )
-            return await con.fetch(final_query, *args)
+    async def get_score_distribution(
+        self,
+        event_ids: Optional[list[int]] = None,
+        season_ids: Optional[list[int]] = None,
+        home_teams: Optional[list[str]] = None,
+        away_teams: Optional[list[str]] = None,
+    ) -> ScoreDistribution:
+        """Scoreline distribution to evaluate any goal market, see ScoreDistribution."""
+        histogram = await self.get_score_histogram(
+            event_ids, season_ids, home_teams, away_teams
+        )
+        return ScoreDistribution.from_histogram(histogram)
 
     async def create_season_table(self) -> None:
-        async with self.client.conn_pool.acquire() as con:
-            return await con.execute(
+        async with self.client.acquire() as con:
+            await con.execute(
                 """
                 CREATE OR REPLACE FUNCTION season_table(events integer[], seasons integer[])
                 RETURNS TABLE(team VARCHAR,
@@ -185,35 +814,20 @@ class MatchPgRepository:
                               conceded_per_game float)
                 AS $$
                     SELECT
-                        team, season_id, sum(points) AS points,
-                        sum(points) / sum(games) AS points_per_game,
-                        sum(score) / sum(games) AS score_per_game,
-                        sum(conceded) / sum(games) AS conceded_per_game FROM
-
-                    (SELECT away_team AS team, season_id, sum(away_team_points) AS points,
-                        sum(away_team_score) AS score, sum(home_team_score) AS conceded,
-                        count(*) AS games
-                        FROM game WHERE event_id = ANY(events)
-                        AND season_id = ANY(seasons)
-                        GROUP BY away_team, season_id
-
-                    UNION
-
-                    SELECT home_team AS team, season_id, sum(home_team_points) AS points,
-                        sum(home_team_score) AS score, sum(away_team_score) AS conceded,
-                        count(*) AS games
-                        FROM game WHERE event_id = ANY(events)
-                        AND season_id = ANY(seasons)
-                        GROUP BY home_team, season_id
-                    ) as query
-                    GROUP BY team, season_id
+                        t.name::varchar, s.season_id::int, sum(s.points)::int AS points,
+                        sum(s.points)::float / sum(s.games) AS points_per_game,
+                        sum(s.goals_for)::float / sum(s.games) AS score_per_game,
+                        sum(s.goals_against)::float / sum(s.games) AS conceded_per_game
+                    FROM team_season_stats s JOIN team t ON t.id = s.team_id
+                    WHERE s.event_id = ANY(events) AND s.season_id = ANY(seasons)
+                    GROUP BY t.id, s.season_id
 
                 $$ LANGUAGE SQL STABLE;""",
             )
 
     async def create_multi_season_table(self) -> None:
-        async with self.client.conn_pool.acquire() as con:
-            return await con.execute(
+        async with self.client.acquire() as con:
+            await con.execute(
                 """
                 CREATE OR REPLACE FUNCTION multi_season_table(events integer[], seasons integer[])
                 RETURNS TABLE(team VARCHAR,
@@ -223,75 +837,210 @@ class MatchPgRepository:
                               conceded_per_game float)
                 AS $$
                     SELECT
-                        team, sum(points) AS points,
-                        sum(points) / sum(games) AS points_per_game,
-                        sum(score) / sum(games) AS score_per_game,
-                        sum(conceded) / sum(games) AS conceded_per_game FROM
-
-                    (SELECT away_team AS team, sum(away_team_points) AS points,
-                        sum(away_team_score) AS score, sum(home_team_score) AS conceded,
-                        count(*) AS games
-                        FROM game WHERE event_id = ANY(events)
-                        AND season_id = ANY(seasons)
-                        GROUP BY away_team
-
-                    UNION
-
-                    SELECT home_team AS team, sum(home_team_points) AS points,
-                        sum(home_team_score) AS score, sum(away_team_score) AS conceded,
-                        count(*) AS games
-                        FROM game WHERE event_id = ANY(events)
-                        AND season_id = ANY(seasons)
-                        GROUP BY home_team
-                    ) as query
-                    GROUP BY team
+                        t.name::varchar, sum(s.points)::int AS points,
+                        sum(s.points)::float / sum(s.games) AS points_per_game,
+                        sum(s.goals_for)::float / sum(s.games) AS score_per_game,
+                        sum(s.goals_against)::float / sum(s.games) AS conceded_per_game
+                    FROM team_season_stats s JOIN team t ON t.id = s.team_id
+                    WHERE s.event_id = ANY(events) AND s.season_id = ANY(seasons)
+                    GROUP BY t.id
                 $$ LANGUAGE SQL STABLE;""",
             )
 
 
-class SeasonPgRepository:
+class NamedEntityPgRepository:
+    """Base repository for name -> id dictionary tables (season, event)."""
+
+    table: ClassVar[str]
+    statement_prefix: ClassVar[str]
+    cache: ClassVar[NameIdCache]
+
     def __init__(self, pg_client: PgClient):
         self.client = pg_client
 
-    async def insert(self, season_name: str) -> asyncpg.Record:
-        async with self.client.conn_pool.acquire() as con:
-            return await con.fetchrow(
-                """
-                INSERT INTO season (name) VALUES ($1)
-                ON CONFLICT(name) DO UPDATE SET name = $1 RETURNING id;
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        cls.statement_prefix = cls.table.strip('"')
+        cls.register_statements()
+
+    @classmethod
+    def register_statements(cls) -> None:
+        """Registers insert, insert_many and get statements of the table."""
+        statements.register(
+            f"{cls.statement_prefix}.insert",
+            f"""
+            INSERT INTO {cls.table} (name) VALUES ($1)
+            ON CONFLICT(name) DO UPDATE SET name = $1 RETURNING id;
             """,
-                season_name,
+        )
+        statements.register(
+            f"{cls.statement_prefix}.insert_many",
+            f"""
+            WITH input AS (
+                SELECT DISTINCT unnest($1::varchar[]) AS name
+            ), inserted AS (
+                INSERT INTO {cls.table} (name) SELECT name FROM input
+                ON CONFLICT(name) DO NOTHING RETURNING id, name
             )
-
-    async def get(self, names: list[str]) -> list[asyncpg.Record]:
-        async with self.client.conn_pool.acquire() as con:
-            return await con.fetch(
-                """
-                SELECT id, name FROM season WHERE name = ANY($1)
+            SELECT id, rtrim(name) AS name FROM inserted
+            UNION ALL
+            SELECT t.id, rtrim(t.name) AS name FROM {cls.table} t
+                JOIN input ON t.name = input.name::bpchar;
+            """,
+        )
+        statements.register(
+            f"{cls.statement_prefix}.get",
+            f"""
+            SELECT id, name FROM {cls.table} WHERE name = ANY($1)
             """,
-                names,
+        )
+
+    async def insert(self, name: str) -> asyncpg.Record:
+        async with self.client.acquire() as con:
+            record = await con.fetchrow_prepared(
+                f"{self.statement_prefix}.insert", name
             )
 
+        self.cache.update({name: record["id"]})
+        return record
 
-class EventPgRepository:
-    def __init__(self, pg_client: PgClient):
-        self.client = pg_client
+    async def insert_many(self, names: list[str]) -> dict[str, int]:
+        """Resolves ids for all names with a single statement.
 
-    async def insert(self, ev_name: str) -> asyncpg.Record:
-        async with self.client.conn_pool.acquire() as con:
-            return await con.fetchrow(
-                """
-                INSERT INTO event (name) VALUES ($1)
-                ON CONFLICT(name) DO UPDATE SET name = $1 RETURNING id;
-            """,
-                ev_name,
+        Missing names are inserted, existing ones are left untouched.
+        """
+        if not names:
+            return {}
+
+        async with self.client.acquire() as con:
+            records = await con.fetch_prepared(
+                f"{self.statement_prefix}.insert_many", names
+            )
+
+        ids = {r["name"]: r["id"] for r in records}
+        self.cache.update(ids)
+        # names inserted concurrently by other transaction are not
+        # visible for this statement, resolve them with a plain select
+        # on primary, replicas might not have them yet
+        _, missing = self.cache.get_many(names)
+        if missing:
+            records = await self.get(missing, readonly=False)
+            ids.update({r["name"].rstrip(): r["id"] for r in records})
+            self.cache.update(ids)
+
+        return ids
+
+    async def get_or_create_many(self, names: list[str]) -> dict[str, int]:
+        """Resolves ids via process-wide cache, goes to database on misses only."""
+        found, missing = self.cache.get_many(names)
+        if missing:
+            resolved = await self.insert_many(missing)
+            for name in names:
+                if name not in found:
+                    found[name] = resolved[self.cache.normalize(name)]
+
+        return found
+
+    async def get_or_create(self, name: str) -> int:
+        ids = await self.get_or_create_many([name])
+        return ids[name]
+
+    async def get(
+        self, names: list[str], readonly: bool = True
+    ) -> list[asyncpg.Record]:
+        async with self.client.acquire(readonly=readonly) as con:
+            return await con.fetch_prepared(f"{self.statement_prefix}.get", names)
+
+
+class TeamPgRepository(NamedEntityPgRepository):
+    """Teams are resolved by normalized name or any of its aliases.
+
+    Names returned by insert_many and get are normalized keys.
+    """
+
+    table = "team"
+    cache = TeamNameCache()
+
+    @classmethod
+    def register_statements(cls) -> None:
+        resolve = """
+            input AS (
+                SELECT DISTINCT ON (normalize_team_name(n)) n AS name,
+                    normalize_team_name(n) AS key
+                FROM unnest($1::varchar[]) n
+            ), known AS (
+                SELECT input.key, coalesce(a.team_id, t.id) AS id FROM input
+                LEFT JOIN team_alias a ON a.alias = input.key
+                LEFT JOIN team t ON t.key = input.key
             )
+        """
+        statements.register(
+            "team.insert",
+            """
+            WITH {0}, inserted AS (
+                INSERT INTO team (name, key)
+                SELECT input.name, input.key FROM input JOIN known USING (key)
+                WHERE known.id IS NULL
+                ON CONFLICT (key) DO UPDATE SET key = excluded.key RETURNING id
+            )
+            SELECT id FROM known WHERE id IS NOT NULL
+            UNION ALL
+            SELECT id FROM inserted;
+            """.format(
+                resolve.replace("$1::varchar[]", "ARRAY[$1::varchar]")
+            ),
+        )
+        statements.register(
+            "team.insert_many",
+            """
+            WITH {0}, inserted AS (
+                INSERT INTO team (name, key)
+                SELECT input.name, input.key FROM input JOIN known USING (key)
+                WHERE known.id IS NULL
+                ON CONFLICT (key) DO NOTHING RETURNING id, key
+            )
+            SELECT id, key AS name FROM known WHERE id IS NOT NULL
+            UNION ALL
+            SELECT id, key AS name FROM inserted;
+            """.format(
+                resolve
+            ),
+        )
+        statements.register(
+            "team.get",
+            """
+            WITH {0}
+            SELECT id, key AS name FROM known WHERE id IS NOT NULL;
+            """.format(
+                resolve
+            ),
+        )
 
-    async def get(self, names: list[str]) -> list[asyncpg.Record]:
-        async with self.client.conn_pool.acquire() as con:
-            return await con.fetch(
+    async def add_alias(self, alias: str, name: str) -> None:
+        """Makes alias resolve to the team known under given name."""
+        async with self.client.acquire() as con:
+            team_id = await con.fetchval(
                 """
-                SELECT id, name FROM event WHERE name = ANY($1)
+                INSERT INTO team_alias (alias, team_id)
+                SELECT normalize_team_name($1), id FROM team_ids(ARRAY[$2::varchar]) id
+                ON CONFLICT (alias) DO UPDATE SET team_id = excluded.team_id
+                RETURNING team_id;
             """,
-                names,
+                alias,
+                name,
             )
+
+        if team_id is None:
+            raise ValueError(f"TeamPgRepository: {name} is not known.")
+
+        self.cache.update({alias: team_id})
+
+
+class SeasonPgRepository(NamedEntityPgRepository):
+    table = "season"
+    cache = NameIdCache()
+
+
+class EventPgRepository(NamedEntityPgRepository):
+    table = '"event"'
+    cache = NameIdCache()
@@ -0,0 +1,106 @@
+"""Named SQL statements prepared once per pool connection."""
+import logging
+from typing import Any, Iterator, Optional
+
+import asyncpg
+from asyncpg.prepared_stmt import PreparedStatement
+
+
+class StatementRegistry:
+    """Holds all repository queries under unique names."""
+
+    def __init__(self) -> None:
+        self.queries: dict[str, str] = {}
+
+    def register(self, name: str, query: str) -> str:
+        if self.queries.get(name, query) != query:
+            raise ValueError(f"StatementRegistry: {name} is already registered.")
+
+        self.queries[name] = query
+        return name
+
+    def __getitem__(self, name: str) -> str:
+        return self.queries[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.queries)
+
+
+statements = StatementRegistry()
+
+
+class PreparedConnection(asyncpg.Connection):
+    """Connection which reuses prepared statements of the registry.
+
+    It also counts executed queries for pool stats.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements: dict[str, PreparedStatement] = {}
+        self.queries = 0
+
+    async def execute(self, *args: Any, **kwargs: Any) -> str:
+        self.queries += 1
+        return await super().execute(*args, **kwargs)
+
+    async def executemany(self, *args: Any, **kwargs: Any) -> None:
+        self.queries += 1
+        return await super().executemany(*args, **kwargs)
+
+    async def fetch(self, *args: Any, **kwargs: Any) -> list[asyncpg.Record]:
+        self.queries += 1
+        return await super().fetch(*args, **kwargs)
+
+    async def fetchrow(self, *args: Any, **kwargs: Any) -> Optional[asyncpg.Record]:
+        self.queries += 1
+        return await super().fetchrow(*args, **kwargs)
+
+    async def fetchval(self, *args: Any, **kwargs: Any) -> Any:
+        self.queries += 1
+        return await super().fetchval(*args, **kwargs)
+
+    async def copy_records_to_table(self, *args: Any, **kwargs: Any) -> str:
+        self.queries += 1
+        return await super().copy_records_to_table(*args, **kwargs)
+
+    def cursor(self, *args: Any, **kwargs: Any) -> Any:
+        self.queries += 1
+        return super().cursor(*args, **kwargs)
+
+    async def prepare_all(self) -> None:
+        """Prepares all registered statements, used as pool init hook."""
+        for name in statements:
+            try:
+                await self.get_prepared(name)
+            except asyncpg.PostgresError as err:
+                # e.g. function isn't created yet, statement is prepared on first use
+                logging.warning("Statement %s isn't prepared: %s", name, err)
+
+    async def get_prepared(self, name: str) -> PreparedStatement:
+        if name not in self.prepared_statements:
+            self.prepared_statements[name] = await self.prepare(statements[name])
+
+        return self.prepared_statements[name]
+
+    async def fetch_prepared(self, name: str, *args: Any) -> list[asyncpg.Record]:
+        self.queries += 1
+        return await self._run_prepared(name, "fetch", *args)
+
+    async def fetchrow_prepared(self, name: str, *args: Any) -> asyncpg.Record:
+        self.queries += 1
+        return await self._run_prepared(name, "fetchrow", *args)
+
+    async def _run_prepared(self, name: str, method: str, *args: Any) -> Any:
+        stmt = await self.get_prepared(name)
+        try:
+            return await getattr(stmt, method)(*args)
+        except asyncpg.exceptions.InvalidCachedStatementError:
+            # result types changed after migration, statement is prepared again
+            del self.prepared_statements[name]
+            if self.is_in_transaction():
+                # aborted transaction can't run the retry, caller retries it
+                raise
+
+            stmt = await self.get_prepared(name)
+            return await getattr(stmt, method)(*args)
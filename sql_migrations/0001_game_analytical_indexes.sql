@@ -0,0 +1,17 @@
+-- every analytical query filters games by event and season
+CREATE INDEX IF NOT EXISTS game_event_season_idx ON game (event_id, season_id);
+
+-- games are inserted mostly in date order, BRIN stays tiny on large tables
+CREATE INDEX IF NOT EXISTS game_date_brin_idx ON game USING brin (date);
+
+-- team side aggregations (get_stats by home/away teams) are served by index only scans
+CREATE INDEX IF NOT EXISTS game_home_team_idx ON game (home_team, event_id, season_id)
+    INCLUDE (home_team_score, away_team_score, home_team_points, away_team_points);
+
+CREATE INDEX IF NOT EXISTS game_away_team_idx ON game (away_team, event_id, season_id)
+    INCLUDE (home_team_score, away_team_score, home_team_points, away_team_points);
+
+-- season_table and multi_season_table read totals of selected events and seasons
+CREATE INDEX IF NOT EXISTS team_season_stats_event_season_idx
+    ON team_season_stats (event_id, season_id)
+    INCLUDE (team, games, points, goals_for, goals_against);
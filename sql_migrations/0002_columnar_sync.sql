@@ -0,0 +1,9 @@
+-- highest game id copied into game_columnar
+CREATE TABLE IF NOT EXISTS columnar_sync (
+    source VARCHAR(64) PRIMARY KEY,
+    last_id BIGINT NOT NULL,
+    synced_at TIMESTAMP NOT NULL DEFAULT now()
+);
+
+INSERT INTO columnar_sync (source, last_id) VALUES ('game', 0)
+ON CONFLICT DO NOTHING;
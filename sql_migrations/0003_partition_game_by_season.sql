@@ -0,0 +1,62 @@
+-- game becomes a LIST partitioned table with one partition per season,
+-- unique constraints of a partitioned table must include season_id
+ALTER TABLE game RENAME TO game_unpartitioned;
+
+DROP INDEX IF EXISTS game_event_season_idx;
+DROP INDEX IF EXISTS game_date_brin_idx;
+DROP INDEX IF EXISTS game_home_team_idx;
+DROP INDEX IF EXISTS game_away_team_idx;
+
+CREATE TABLE game (
+    LIKE game_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS,
+    PRIMARY KEY (id, season_id),
+    UNIQUE (home_team, away_team, date, season_id)
+) PARTITION BY LIST (season_id);
+
+ALTER SEQUENCE game_id_seq OWNED BY game.id;
+
+CREATE INDEX IF NOT EXISTS game_event_season_idx ON game (event_id, season_id);
+
+CREATE INDEX IF NOT EXISTS game_date_brin_idx ON game USING brin (date);
+
+CREATE INDEX IF NOT EXISTS game_home_team_idx ON game (home_team, event_id, season_id)
+    INCLUDE (home_team_score, away_team_score, home_team_points, away_team_points);
+
+CREATE INDEX IF NOT EXISTS game_away_team_idx ON game (away_team, event_id, season_id)
+    INCLUDE (home_team_score, away_team_score, home_team_points, away_team_points);
+
+-- creates partition for a season, safe to call concurrently
+CREATE OR REPLACE FUNCTION ensure_game_partition(season BIGINT) RETURNS void AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('game_partitions'), 0);
+    IF to_regclass(format('game_season_%s', season)) IS NULL THEN
+        EXECUTE format(
+            'CREATE TABLE game_season_%s PARTITION OF game FOR VALUES IN (%s)',
+            season, season
+        );
+    END IF;
+END
+$$ LANGUAGE plpgsql;
+
+SELECT ensure_game_partition(season_id)
+FROM (SELECT DISTINCT season_id FROM game_unpartitioned WHERE season_id IS NOT NULL) s;
+
+INSERT INTO game SELECT * FROM game_unpartitioned WHERE season_id IS NOT NULL;
+
+-- games without a season can't be partitioned, they are kept aside
+-- to be fixed and re-inserted manually
+CREATE TABLE IF NOT EXISTS game_without_season AS
+SELECT * FROM game_unpartitioned WHERE season_id IS NULL;
+
+DO $$
+DECLARE
+    kept BIGINT;
+BEGIN
+    SELECT count(*) INTO kept FROM game_without_season;
+    IF kept > 0 THEN
+        RAISE WARNING '% games without season_id are moved to game_without_season', kept;
+    END IF;
+END
+$$;
+
+DROP TABLE game_unpartitioned;
@@ -0,0 +1,113 @@
+-- teams are referenced by integer ids instead of blank-padded CHAR(64) names
+
+-- must match TeamNameCache.normalize
+CREATE OR REPLACE FUNCTION normalize_team_name(name TEXT) RETURNS TEXT AS $$
+    SELECT lower(regexp_replace(btrim(name), '\s+', ' ', 'g'))
+$$ LANGUAGE SQL IMMUTABLE;
+
+CREATE TABLE IF NOT EXISTS team (
+    id BIGSERIAL PRIMARY KEY,
+    -- spelling of the first seen name, returned by read queries
+    name VARCHAR(64) NOT NULL,
+    key VARCHAR(64) NOT NULL UNIQUE
+);
+
+-- other spellings of team names, normalized
+CREATE TABLE IF NOT EXISTS team_alias (
+    alias VARCHAR(64) PRIMARY KEY,
+    team_id BIGINT NOT NULL REFERENCES team (id)
+);
+
+-- resolves names (any spelling) to team ids, unknown names are skipped
+CREATE OR REPLACE FUNCTION team_ids(names VARCHAR[]) RETURNS SETOF BIGINT AS $$
+    SELECT coalesce(a.team_id, t.id)
+    FROM unnest(names) n
+    LEFT JOIN team_alias a ON a.alias = normalize_team_name(n)
+    LEFT JOIN team t ON t.key = normalize_team_name(n)
+    WHERE coalesce(a.team_id, t.id) IS NOT NULL
+$$ LANGUAGE SQL STABLE;
+
+INSERT INTO team (name, key)
+SELECT DISTINCT ON (normalize_team_name(name)) rtrim(name), normalize_team_name(name)
+FROM (
+    SELECT home_team AS name FROM game
+    UNION SELECT away_team FROM game
+    UNION SELECT team FROM team_season_stats
+) names
+WHERE name IS NOT NULL
+ORDER BY normalize_team_name(name), name
+ON CONFLICT (key) DO NOTHING;
+
+
+-- game: dropping name columns drops the fixture key and team indexes too
+ALTER TABLE game ADD COLUMN home_team_id BIGINT, ADD COLUMN away_team_id BIGINT;
+
+UPDATE game g SET home_team_id = h.id, away_team_id = a.id
+FROM team h, team a
+WHERE h.key = normalize_team_name(g.home_team)
+    AND a.key = normalize_team_name(g.away_team);
+
+ALTER TABLE game DROP COLUMN home_team, DROP COLUMN away_team;
+
+ALTER TABLE game ADD UNIQUE (home_team_id, away_team_id, date, season_id);
+
+CREATE INDEX IF NOT EXISTS game_home_team_idx ON game (home_team_id, event_id, season_id)
+    INCLUDE (home_team_score, away_team_score, home_team_points, away_team_points);
+
+CREATE INDEX IF NOT EXISTS game_away_team_idx ON game (away_team_id, event_id, season_id)
+    INCLUDE (home_team_score, away_team_score, home_team_points, away_team_points);
+
+
+-- team_season_stats
+ALTER TABLE team_season_stats ADD COLUMN team_id BIGINT;
+
+UPDATE team_season_stats s SET team_id = t.id
+FROM team t WHERE t.key = normalize_team_name(s.team);
+
+ALTER TABLE team_season_stats DROP CONSTRAINT team_season_stats_pkey;
+ALTER TABLE team_season_stats DROP COLUMN team;
+ALTER TABLE team_season_stats ADD PRIMARY KEY (team_id, event_id, season_id, venue);
+
+CREATE INDEX IF NOT EXISTS team_season_stats_event_season_idx
+    ON team_season_stats (event_id, season_id)
+    INCLUDE (team_id, games, points, goals_for, goals_against);
+
+
+-- columnar tables are rebuilt rather than updated in place
+CREATE TABLE game_columnar_v2 (
+    id BIGINT,
+    home_team_id BIGINT,
+    away_team_id BIGINT,
+
+    event_id BIGINT,
+    season_id BIGINT,
+    date DATE,
+
+    home_team_xg FLOAT NULL,
+    away_team_xg FLOAT NULL,
+
+    home_team_score INT,
+    away_team_score INT,
+
+    home_team_shots INT NULL,
+    away_team_shots INT NULL,
+
+    home_team_corners INT NULL,
+    away_team_corners INT NULL,
+
+    home_team_points INT,
+    away_team_points INT
+
+) USING columnar;
+
+INSERT INTO game_columnar_v2
+SELECT c.id, h.id, a.id, c.event_id, c.season_id, c.date,
+    c.home_team_xg, c.away_team_xg, c.home_team_score, c.away_team_score,
+    c.home_team_shots, c.away_team_shots, c.home_team_corners, c.away_team_corners,
+    c.home_team_points, c.away_team_points
+FROM game_columnar c
+LEFT JOIN team h ON h.key = normalize_team_name(c.home_team)
+LEFT JOIN team a ON a.key = normalize_team_name(c.away_team);
+
+DROP TABLE game_columnar;
+ALTER TABLE game_columnar_v2 RENAME TO game_columnar;
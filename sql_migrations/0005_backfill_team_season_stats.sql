@@ -0,0 +1,31 @@
+-- team_season_stats is maintained by inserts only, here games stored
+-- before it existed are counted too
+
+-- writers wait until the backfill is committed
+LOCK TABLE game IN SHARE MODE;
+
+-- NaN xG would poison the sums
+UPDATE game SET home_team_xg = NULL WHERE home_team_xg = 'NaN';
+UPDATE game SET away_team_xg = NULL WHERE away_team_xg = 'NaN';
+
+TRUNCATE team_season_stats;
+
+INSERT INTO team_season_stats (
+    team_id, event_id, season_id, venue, games, points,
+    goals_for, goals_against, xg_for, xg_against
+)
+SELECT home_team_id, event_id, season_id, 'home',
+    count(*), sum(home_team_points),
+    sum(home_team_score), sum(away_team_score),
+    sum(home_team_xg), sum(away_team_xg)
+FROM game WHERE home_team_id IS NOT NULL AND event_id IS NOT NULL
+GROUP BY home_team_id, event_id, season_id
+
+UNION ALL
+
+SELECT away_team_id, event_id, season_id, 'away',
+    count(*), sum(away_team_points),
+    sum(away_team_score), sum(home_team_score),
+    sum(away_team_xg), sum(home_team_xg)
+FROM game WHERE away_team_id IS NOT NULL AND event_id IS NOT NULL
+GROUP BY away_team_id, event_id, season_id;
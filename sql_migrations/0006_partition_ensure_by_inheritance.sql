@@ -0,0 +1,17 @@
+-- a detached partition is a standalone table, only attached partitions count
+CREATE OR REPLACE FUNCTION ensure_game_partition(season BIGINT) RETURNS void AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('game_partitions'), 0);
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'game'::regclass
+            AND c.relname = format('game_season_%s', season)
+    ) THEN
+        EXECUTE format(
+            'CREATE TABLE game_season_%s PARTITION OF game FOR VALUES IN (%s)',
+            season, season
+        );
+    END IF;
+END
+$$ LANGUAGE plpgsql;
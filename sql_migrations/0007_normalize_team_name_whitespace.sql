@@ -0,0 +1,30 @@
+-- whitespace is collapsed before trimming, so leading and trailing tabs or
+-- newlines are dropped like in TeamNameCache.normalize
+CREATE OR REPLACE FUNCTION normalize_team_name(name TEXT) RETURNS TEXT AS $$
+    SELECT lower(btrim(regexp_replace(name, '\s+', ' ', 'g')))
+$$ LANGUAGE SQL IMMUTABLE;
+
+UPDATE team_alias a SET alias = normalize_team_name(a.alias)
+WHERE a.alias <> normalize_team_name(a.alias)
+    AND NOT EXISTS (
+        SELECT 1 FROM team_alias o WHERE o.alias = normalize_team_name(a.alias)
+    );
+
+-- keys of teams which became duplicates are kept, they need a manual merge
+UPDATE team t SET key = normalize_team_name(t.key)
+WHERE t.key <> normalize_team_name(t.key)
+    AND NOT EXISTS (SELECT 1 FROM team o WHERE o.key = normalize_team_name(t.key));
+
+DO $$
+DECLARE
+    duplicate RECORD;
+BEGIN
+    FOR duplicate IN
+        SELECT t.id, t.key, o.id AS other_id FROM team t
+        JOIN team o ON o.key = normalize_team_name(t.key) AND o.id <> t.id
+    LOOP
+        RAISE WARNING 'team % (%) duplicates team %',
+            duplicate.id, duplicate.key, duplicate.other_id;
+    END LOOP;
+END
+$$;
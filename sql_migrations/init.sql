@@ -50,6 +50,24 @@ CREATE TABLE IF NOT EXISTS game (
 );
 
 
+-- per team and venue totals of a season, maintained by game inserts
+CREATE TABLE IF NOT EXISTS team_season_stats (
+    team CHAR(64),
+    event_id BIGINT,
+    season_id BIGINT,
+    venue VARCHAR(4) CHECK (venue IN ('home', 'away')),
+
+    games INT NOT NULL,
+    points INT NOT NULL,
+    goals_for INT NOT NULL,
+    goals_against INT NOT NULL,
+    xg_for FLOAT NULL,
+    xg_against FLOAT NULL,
+
+    PRIMARY KEY (team, event_id, season_id, venue)
+);
+
+
 CREATE TABLE IF NOT EXISTS game_columnar (
     id BIGSERIAL,
     home_team CHAR(64),
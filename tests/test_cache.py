@@ -0,0 +1,125 @@
+import asyncio
+
+from helpers.utils import MetricRecord
+from repository.base import read_from_primary
+from repository.cache import (
+    MAX_PAYLOAD_SIZE,
+    ResultCache,
+    TeamNameCache,
+    cached_query,
+    pack_touched,
+    unpack_touched,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class StatsRepository:
+    def __init__(self, result_cache):
+        self.result_cache = result_cache
+        self.calls = 0
+        self.routed = []
+
+    @cached_query
+    async def get_by_points(self, event_ids, season_ids, points):
+        self.calls += 1
+        self.routed.append(read_from_primary.get())
+        return [(e, s, points.min_value) for e in event_ids for s in season_ids]
+
+
+def test_cached_query_normalizes_arguments():
+    repo = StatsRepository(ResultCache())
+
+    async def run():
+        first = await repo.get_by_points([1, 2], [10], MetricRecord(1, 2))
+        second = await repo.get_by_points([2, 1, 1], [10], points=MetricRecord(1, 2))
+        assert first == second
+        await repo.get_by_points([1, 2], [10], MetricRecord(0, 2))
+
+    asyncio.run(run())
+    assert repo.calls == 2
+    assert repo.result_cache.stats()["hits"] == 1
+
+
+def test_cache_fills_after_invalidation_read_primary():
+    clock = FakeClock()
+    repo = StatsRepository(ResultCache(clock=clock, replica_lag=5))
+    repo.result_cache.invalidate([(3, 10)])
+
+    async def run():
+        points = MetricRecord(1, 2)
+        await repo.get_by_points([1, 2], [10], points)
+        repo.result_cache.invalidate([(1, 10)])
+        await repo.get_by_points([1, 2], [10], points)
+        clock.now = 6
+        await repo.get_by_points([1], [10], points)
+
+    asyncio.run(run())
+    assert repo.routed == [False, True, False]
+    assert read_from_primary.get() is False
+
+
+def test_invalidate_by_event_and_season():
+    cache = ResultCache()
+    cache.set("epl", [1], event_ids=[1], season_ids=[2019, 2020])
+    cache.set("mls", [2], event_ids=[2], season_ids=[2020])
+    cache.set("all", [3])
+
+    assert cache.invalidate([(1, 2018)]) == 1
+    assert cache.get("epl") == (True, [1])
+    assert cache.invalidate([(1, 2020)]) == 1
+    assert cache.get("epl") == (False, None)
+    assert cache.get("mls") == (True, [2])
+
+
+def test_ttl_and_lru_eviction():
+    clock = FakeClock()
+    cache = ResultCache(maxsize=2, ttl=10, clock=clock)
+    cache.set("a", [1])
+    cache.set("b", [2])
+    cache.get("a")
+    cache.set("c", [3])
+
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, [1])
+
+    clock.now = 11
+    assert cache.get("a") == (False, None)
+    assert cache.stats()["entries"] == 1
+
+
+def test_memory_limit():
+    cache = ResultCache(max_bytes=1200)
+    cache.set("a", list(range(20)))
+    cache.set("b", list(range(20)))
+
+    assert cache.stats()["bytes"] <= 1200
+    assert cache.get("a") == (False, None)
+    assert cache.get("b") == (True, list(range(20)))
+
+
+def test_touched_payloads():
+    touched = [(event_id, 2020 + event_id % 3) for event_id in range(2000)]
+    payloads = pack_touched(touched)
+
+    assert len(payloads) > 1
+    assert all(len(p) <= MAX_PAYLOAD_SIZE for p in payloads)
+    assert [pair for p in payloads for pair in unpack_touched(p)] == touched
+    assert pack_touched([]) == []
+
+
+def test_team_names_normalization():
+    cache = TeamNameCache()
+    cache.update({"Manchester  United": 1})
+
+    found, missing = cache.get_many(["manchester united ", "Real Madrid", "real  madrid"])
+
+    assert found == {"manchester united ": 1}
+    # first spelling of a missing name is kept for insert
+    assert missing == ["Real Madrid"]
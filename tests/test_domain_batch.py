@@ -0,0 +1,107 @@
+from datetime import datetime
+
+import numpy as np
+
+from domain import FootballMatch, MatchBatch, Venue
+
+
+def make_match(team1_ft_score, team2_ft_score, **kwargs):
+    raw_data = {
+        "date": datetime(2020, 8, 12),
+        "team1_name": "Arsenal",
+        "team2_name": "Chelsea",
+        "team1_ft_score": team1_ft_score,
+        "team2_ft_score": team2_ft_score,
+        "venue": "team1",
+        "team1_id": None,
+        "team2_id": None,
+        "event_id": 1,
+        "season_id": 2,
+        "group": -1,
+        "team1_points": 1,
+        "team2_points": 1,
+        "team1_ht_score": None,
+        "team2_ht_score": None,
+    }
+    raw_data.update(kwargs)
+    return FootballMatch(**raw_data)
+
+
+def test_batch_roundtrip():
+    matches = [make_match(1, 1), make_match(2, 0, team1_ht_score=1, team2_ht_score=0)]
+    batch = MatchBatch.from_matches(matches)
+
+    assert len(batch) == 2
+    assert batch["team1_ft_score"].dtype == np.int16
+    assert [m.as_dict() for m in batch.to_matches()] == [m.as_dict() for m in matches]
+
+
+def test_batch_row_view():
+    batch = MatchBatch.from_matches([make_match(1, 1), make_match(3, 2)])
+
+    row = batch[-1]
+    assert row.team1_ft_score == 3
+    assert row.team1_ht_score is None
+    assert row.date == datetime(2020, 8, 12)
+    assert row.to_match().team2_ft_score == 2
+
+
+def test_batch_slice_is_view():
+    batch = MatchBatch.from_matches([make_match(i, 0) for i in range(5)])
+
+    part = batch[1:3]
+    assert len(part) == 2
+    assert np.shares_memory(part["team1_ft_score"], batch["team1_ft_score"])
+    assert [r.team1_ft_score for r in part] == [1, 2]
+
+
+def test_batch_iter_tuples():
+    batch = MatchBatch.from_matches([make_match(1, 0, team_1xg=1.5)])
+
+    rows = list(batch.iter_tuples(["team1_name", "team1_ft_score", "team_1xg"]))
+    assert rows == [("Arsenal", 1, 1.5)]
+    assert type(rows[0][1]) is int
+
+
+def test_batch_predicates_match_scalar_methods():
+    scores = [(0, 0), (1, 0), (0, 2), (2, 2), (3, 1), (1, 4)]
+    matches = [make_match(*s) for s in scores]
+    batch = MatchBatch.from_matches(matches)
+
+    for method in ("is_btts", "is_home_win", "is_draw", "is_away_win"):
+        expected = [getattr(m, method)() for m in matches]
+        assert getattr(batch, method)().tolist() == expected, method
+
+    for venue in (Venue.TEAM1, Venue.TEAM2):
+        expected = [m.is_clean_sheet(venue) for m in matches]
+        assert batch.is_clean_sheet(venue).tolist() == expected
+
+    totals = [0.5, 1.5, 2.5, 3.5, 4.5]
+    over, under = batch.is_over(totals), batch.is_under(totals)
+    assert over.shape == (len(totals), len(matches))
+    for i, total in enumerate(totals):
+        assert over[i].tolist() == [m.is_over(total) for m in matches]
+        assert under[i].tolist() == [m.is_under(total) for m in matches]
+
+    assert batch.is_over().tolist() == [m.is_over() for m in matches]
+
+
+def test_batch_from_partial_columns():
+    batch = MatchBatch({"team1_ft_score": np.array([1, 0]), "team_1xg": [0.5, 1.0]})
+
+    assert len(batch) == 2
+    assert np.isnan(batch["team_2xg"]).all()
+    assert np.isnat(batch["date"]).all()
+
+    # matches without away score don't settle any market
+    for method in ("is_btts", "is_home_win", "is_draw", "is_away_win", "is_over"):
+        assert getattr(batch, method)().tolist() == [False, False], method
+    assert batch.is_under([0.5, 3.5]).tolist() == [[False, False], [False, False]]
+    assert batch.is_clean_sheet(Venue.TEAM1).tolist() == [False, False]
+
+    row = batch[0]
+    assert row.team1_ft_score == 1 and row.team2_ft_score is None
+    assert row.team1_points is None and row.group is None
+    assert row.team1_name is None and row.date is None
+    assert [m.team1_points for m in batch.to_matches()] == [None, None]
+    assert list(batch.iter_tuples(["team2_ft_score", "group"])) == [(None, None)] * 2
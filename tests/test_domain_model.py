@@ -16,3 +16,47 @@ def test_btts():
     raw_data["team2_ft_score"] = 1
     match = FootballMatch(**raw_data)
     assert match.is_btts() == True
+
+
+def test_match_result():
+    match = FootballMatch(team1_ft_score=2, team2_ft_score=1)
+    assert match.is_home_win() == True
+    assert match.is_draw() == False
+    assert match.is_away_win() == False
+
+    match = FootballMatch(team1_ft_score=1, team2_ft_score=1)
+    assert match.is_home_win() == False
+    assert match.is_draw() == True
+
+
+def test_serialization():
+    from dataclasses import asdict, astuple
+
+    match = FootballMatch.from_dict(
+        {
+            "_id": "5f3e2a",
+            "date": None,
+            "team1_name": "Arsenal",
+            "team2_name": "Chelsea",
+            "team1_ft_score": 2,
+            "team2_ft_score": 1,
+            "venue": "team1",
+            "team1_id": None,
+            "team2_id": None,
+            "event_id": 1,
+            "season_id": 2,
+            "group": -1,
+            "team1_points": 3,
+            "team2_points": 0,
+        }
+    )
+
+    assert not hasattr(match, "__dict__")
+    assert match.match_type == "football"
+    assert match.as_dict() == asdict(match)
+    assert match.as_tuple() == astuple(match)
+    assert FootballMatch.from_row(match.as_tuple()) == match
+    assert FootballMatch.row_getter("team1_name", "team2_name")(match) == (
+        "Arsenal",
+        "Chelsea",
+    )
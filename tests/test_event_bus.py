@@ -0,0 +1,306 @@
+import asyncio
+import contextlib
+import os
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from domain import FootballMatch
+from event_bus import MemoryEventBus, ExecutionPolicy, SocketBroker, SocketEventBus
+from event_bus.codec import PICKLED, EventCodec, Reader, pack_short_str, type_name
+
+
+class MatchCreated:
+    def __init__(self, value):
+        self.value = value
+
+
+def make_codec():
+    codec = EventCodec()
+    codec.register(MatchCreated, ("value",))
+    return codec
+
+
+@pytest.fixture(params=["memory", "socket"])
+def open_bus(request, tmp_path):
+    """Behavioral tests below have to pass for every EventBus implementation."""
+
+    @contextlib.asynccontextmanager
+    async def factory(**options):
+        if request.param == "memory":
+            bus = MemoryEventBus(**options)
+            yield bus
+            await bus.close()
+        else:
+            broker = SocketBroker(str(tmp_path / "bus.sock"))
+            await broker.start()
+            bus = SocketEventBus(broker.path, make_codec(), **options)
+            yield bus
+            await bus.close()
+            await broker.close()
+
+    return factory
+
+
+async def wait_for(predicate, timeout=1.0):
+    """Socket bus delivers events asynchronously, waits until they arrive."""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.001)
+
+
+def test_publish(open_bus):
+    received, batches = [], []
+
+    async def async_handler(event):
+        received.append(event.value)
+
+    async def run():
+        async with open_bus() as bus:
+            bus.register(MatchCreated, async_handler)
+            bus.register(MatchCreated, lambda e: received.append(e.value * 10))
+            bus.register(list, batches.append)
+
+            await bus.publish_one_async(MatchCreated(1))
+            await bus.publish_batch_async(list, [MatchCreated(2), MatchCreated(3)])
+
+    asyncio.run(run())
+    assert received == [1, 10]
+    assert [[e.value for e in b] for b in batches] == [[2, 3]]
+
+
+def test_publish_keeps_order(open_bus):
+    received = []
+
+    async def run():
+        async with open_bus() as bus:
+            bus.register(MatchCreated, lambda e: received.append(e.value))
+            bus.register(FootballMatch, lambda e: received.append(e.group))
+            for i in range(100):
+                await bus.publish_one_async(MatchCreated(i))
+                await bus.publish_one_async(FootballMatch(group=i))
+
+    asyncio.run(run())
+    assert received[0::2] == list(range(100))
+    assert received[1::2] == list(range(100))
+
+
+def test_close_flushes_batches(open_bus):
+    batches = []
+
+    async def run():
+        async with open_bus() as bus:
+            bus.register_batch(MatchCreated, batches.append, max_latency=60)
+            for i in range(3):
+                await bus.publish_one_async(MatchCreated(i))
+
+    asyncio.run(run())
+    assert [[e.value for e in b] for b in batches] == [[0, 1, 2]]
+
+
+def test_socket_bus_fan_out(tmp_path):
+    received = {1: [], 2: []}
+
+    async def run():
+        broker = SocketBroker(str(tmp_path / "bus.sock"))
+        await broker.start()
+        assert os.stat(broker.path).st_mode & 0o777 == 0o600
+        publisher = SocketEventBus(broker.path)
+        subscribers = [SocketEventBus(broker.path) for _ in received]
+        for key, bus in zip(received, subscribers):
+            bus.register(FootballMatch, received[key].append)
+            await bus.connect()
+
+        # subscription frames are sent ahead of synchronization frame
+        await asyncio.gather(*(bus.drain() for bus in subscribers))
+        await publisher.publish_batch_async(
+            FootballMatch, [FootballMatch(group=1), FootballMatch(group=2)]
+        )
+        await publisher.close()
+        for bus in subscribers:
+            await bus.drain()
+            await bus.close()
+        await broker.close()
+
+    asyncio.run(run())
+    assert [[m.group for m in batch] for batch in received[1]] == [[1, 2]]
+    assert [[m.group for m in batch] for batch in received[2]] == [[1, 2]]
+
+
+def test_codec_roundtrip():
+    codec = make_codec()
+    match = FootballMatch(
+        date=datetime(2020, 8, 12, 19, 30),
+        team1_name="Arsenal",
+        team2_name="Chelsea",
+        team1_ft_score=2,
+        team2_ft_score=1,
+        team1_goals_time=[12, 67],
+        team_1xg=1.25,
+        event_id=1,
+    )
+
+    data = codec.encode_many([match, MatchCreated(1)])
+    decoded_match, event = codec.decode_many(Reader(data))
+    assert decoded_match.date == match.date
+    assert decoded_match.team1_name == "Arsenal"
+    assert decoded_match.team_1xg == 1.25
+    assert decoded_match.team1_goals_time == [12, 67]
+    assert not hasattr(decoded_match, "season_id")
+    assert event.value == 1
+
+
+def test_codec_rejects_unknown_types():
+    codec = EventCodec()
+
+    with pytest.raises(TypeError):
+        codec.encode(MatchCreated(1))
+
+    with pytest.raises(TypeError):
+        codec.encode(FootballMatch(group={"not": "encodable"}))
+
+    data = make_codec().encode(MatchCreated(1))
+    with pytest.raises(ValueError):
+        codec.decode(Reader(data))
+
+    # pickled values are not decoded anymore
+    data = pack_short_str(type_name(MatchCreated)) + bytes([PICKLED, 0, 0, 0, 0])
+    with pytest.raises(ValueError):
+        make_codec().decode(Reader(data))
+
+
+def test_queued_handlers_run_concurrently(open_bus):
+    fast, slow = [], []
+
+    async def slow_handler(event):
+        await asyncio.sleep(0.05)
+        slow.append(event.value)
+
+    async def run():
+        async with open_bus(workers=1) as bus:
+            bus.register(MatchCreated, slow_handler)
+            bus.register(MatchCreated, lambda e: fast.append(e.value), workers=4)
+            for i in range(4):
+                await bus.publish_one_async(MatchCreated(i))
+
+            # slow handler doesn't delay other subscribers
+            await wait_for(lambda: len(fast) == 4)
+            assert len(slow) < 4
+
+    asyncio.run(run())
+    assert slow == [0, 1, 2, 3]
+
+
+def test_queued_handler_errors_dont_stop_workers(open_bus):
+    received = []
+
+    def handler(event):
+        if event.value == 0:
+            raise ValueError("broken event")
+        received.append(event.value)
+
+    async def run():
+        async with open_bus(workers=1) as bus:
+            bus.register(MatchCreated, handler)
+            await bus.publish_one_async(MatchCreated(0))
+            await bus.publish_one_async(MatchCreated(1))
+
+    asyncio.run(run())
+    assert received == [1]
+
+
+def test_batching_by_size_and_latency(open_bus):
+    batches = []
+
+    async def run():
+        async with open_bus() as bus:
+            bus.register_batch(
+                MatchCreated, batches.append, max_size=3, max_latency=0.02
+            )
+            for i in range(7):
+                await bus.publish_one_async(MatchCreated(i))
+
+            await wait_for(lambda: len(batches) == 2)
+            assert [[e.value for e in b] for b in batches] == [[0, 1, 2], [3, 4, 5]]
+            # deadline flushes incomplete batch
+            await wait_for(lambda: len(batches) == 3)
+            assert [e.value for e in batches[-1]] == [6]
+
+            await bus.publish_one_async(MatchCreated(7))
+
+    asyncio.run(run())
+    assert [[e.value for e in b] for b in batches] == [[0, 1, 2], [3, 4, 5], [6], [7]]
+
+
+def write_pid(event):
+    with open(event.value, "w") as f:
+        f.write(str(os.getpid()))
+
+
+def fail(event):
+    raise ValueError(event.value)
+
+
+def test_offloaded_handlers(open_bus, tmp_path):
+    threads = []
+    pid_path = str(tmp_path / "handler.pid")
+
+    async def run():
+        async with open_bus(thread_pool_size=2, process_pool_size=1) as bus:
+            bus.register(MatchCreated, lambda e: threads.append(threading.get_ident()))
+            bus.register(
+                MatchCreated,
+                lambda e: threads.append(threading.get_ident()),
+                policy=ExecutionPolicy.THREAD,
+            )
+            bus.register(MatchCreated, write_pid, policy=ExecutionPolicy.PROCESS)
+            await bus.publish_one_async(MatchCreated(pid_path))
+
+    asyncio.run(run())
+    inline_thread, pool_thread = threads
+    assert inline_thread == threading.get_ident()
+    assert pool_thread != threading.get_ident()
+    with open(pid_path) as f:
+        assert int(f.read()) != os.getpid()
+
+
+def test_close_does_not_block_loop():
+    bus = MemoryEventBus()
+    bus.register(MatchCreated, lambda e: time.sleep(0.1), policy=ExecutionPolicy.THREAD)
+
+    async def run():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        publisher = asyncio.create_task(bus.publish_one_async(MatchCreated(1)))
+        await asyncio.sleep(0)
+        await bus.close()
+        assert publisher.done()
+        ticker.cancel()
+        return ticks
+
+    assert asyncio.run(run()) >= 3
+
+
+def test_offloaded_handler_error_propagates():
+    # socket bus handlers run in the receiving process, errors are logged there
+    bus = MemoryEventBus()
+    bus.register(MatchCreated, fail, policy=ExecutionPolicy.THREAD)
+
+    async def run():
+        try:
+            await bus.publish_one_async(MatchCreated(1))
+        finally:
+            await bus.close()
+
+    with pytest.raises(ValueError):
+        asyncio.run(run())
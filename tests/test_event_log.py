@@ -0,0 +1,59 @@
+import asyncio
+
+from domain import FootballMatch
+from event_bus import EventLog, MemoryEventBus
+
+
+def test_append_and_replay_across_segments(tmp_path):
+    log = EventLog(str(tmp_path), segment_size=256)
+    offsets = [log.append(FootballMatch(group=i, team1_name="Arsenal")) for i in range(20)]
+    log.close()
+
+    assert len(list(tmp_path.glob("*.log"))) > 1
+
+    log = EventLog(str(tmp_path), segment_size=256)
+    entries = list(log.replay())
+    assert [e.event.group for e in entries] == list(range(20))
+    assert [e.offset for e in entries] == offsets
+
+    # replay from the middle of the log
+    assert [e.event.group for e in log.replay(offsets[15])] == list(range(15, 20))
+
+    log.append(FootballMatch(group=20))
+    assert [e.event.group for e in log.replay(entries[-1].next_offset)] == [20]
+    log.close()
+
+
+def test_torn_record_is_discarded(tmp_path):
+    log = EventLog(str(tmp_path))
+    log.append(FootballMatch(group=1))
+    offset = log.append(FootballMatch(group=2))
+    segment = log.segments[-1]
+    # corrupt payload of the last record
+    segment.mmap[offset + 10] ^= 0xFF
+    log.close()
+
+    log = EventLog(str(tmp_path))
+    assert [e.event.group for e in log.replay()] == [1]
+    log.append(FootballMatch(group=3))
+    assert [e.event.group for e in log.replay()] == [1, 3]
+    log.close()
+
+
+def test_bus_replay_resumes_from_checkpoint(tmp_path):
+    log = EventLog(str(tmp_path))
+    bus = MemoryEventBus(event_log=log)
+    received = []
+
+    async def run():
+        for i in range(3):
+            await bus.publish_one_async(FootballMatch(group=i))
+
+        await bus.replay(FootballMatch, lambda m: received.append(m.group), "stats")
+        await bus.publish_one_async(FootballMatch(group=3))
+        await bus.replay(FootballMatch, lambda m: received.append(m.group), "stats")
+        await bus.close()
+
+    asyncio.run(run())
+    log.close()
+    assert received == [0, 1, 2, 3]
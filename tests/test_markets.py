@@ -0,0 +1,58 @@
+import pytest
+
+from domain import FootballMatch, ScoreDistribution, Venue
+from domain.markets import Outcome, split_line
+
+SCORES = [(0, 0), (1, 0), (2, 1), (1, 1), (0, 2), (3, 1), (2, 2), (1, 0)]
+
+
+@pytest.fixture
+def distribution():
+    histogram = {}
+    for score in SCORES:
+        histogram[score] = histogram.get(score, 0) + 1
+
+    return ScoreDistribution.from_histogram(
+        (home, away, games) for (home, away), games in histogram.items()
+    )
+
+
+def share(predicate):
+    matches = [FootballMatch(team1_ft_score=h, team2_ft_score=a) for h, a in SCORES]
+    return sum(map(predicate, matches)) / len(matches)
+
+
+def test_matches_scalar_predicates(distribution):
+    assert distribution.total == len(SCORES)
+    assert distribution.match_result() == (
+        share(FootballMatch.is_home_win),
+        share(FootballMatch.is_draw),
+        share(FootballMatch.is_away_win),
+    )
+    assert distribution.btts() == share(FootballMatch.is_btts)
+    assert distribution.over(2.5).win == share(lambda m: m.is_over(2.5))
+    assert distribution.under(2.5).win == share(lambda m: m.is_under(2.5))
+    assert distribution.correct_score(1, 0) == 2 / 8
+    assert distribution.correct_score(7, 0) == 0.0
+
+
+def test_whole_and_quarter_lines(distribution):
+    # totals: 0, 1, 3, 2, 2, 4, 4, 1
+    assert distribution.over(2) == Outcome(3 / 8, 2 / 8, 3 / 8)
+    # half of stake on 2.0 and half on 2.5
+    assert distribution.over(2.25) == Outcome(3 / 8, 1 / 8, 4 / 8)
+    assert split_line(-0.75) == (-1.0, -0.5)
+
+    # margins: 0, 1, 1, 0, -2, 2, 0, 1
+    assert distribution.asian_handicap(0) == Outcome(4 / 8, 3 / 8, 1 / 8)
+    assert distribution.asian_handicap(-0.25) == Outcome(4 / 8, 1.5 / 8, 2.5 / 8)
+    assert distribution.asian_handicap(0.5, Venue.TEAM2) == Outcome(4 / 8, 0, 4 / 8)
+
+    with pytest.raises(ValueError):
+        distribution.over(2.1)
+
+
+def test_empty_distribution():
+    distribution = ScoreDistribution.from_histogram([])
+    assert distribution.total == 0
+    assert distribution.match_result() == (0.0, 0.0, 0.0)
@@ -0,0 +1,247 @@
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from bson.objectid import ObjectId
+from pymongo.errors import BulkWriteError
+
+from domain import FootballMatch, MatchBatch
+from repository.mongo_repo import (
+    UNIQUE_KEY,
+    AsyncMatchMongoRepository,
+    MatchMongoRepository,
+)
+
+
+class FakeCollection:
+    """Collection stand-in which records find arguments."""
+
+    def __init__(self, documents):
+        self.documents = documents
+        self.calls = []
+        # threads which closed cursors
+        self.closed_by = []
+
+    def find(self, query, **options):
+        self.calls.append((query, options))
+        limit = options["limit"] or len(self.documents)
+        fields = options["projection"]
+        try:
+            for document in self.documents[:limit]:
+                if fields:
+                    document = {k: v for k, v in document.items() if fields.get(k)}
+                yield document
+        finally:
+            self.closed_by.append(threading.get_ident())
+
+
+def make_document(i):
+    return {
+        "_id": ObjectId(),
+        "date": datetime(2021, 1, i + 1),
+        "team1_name": f"team{i}",
+        "team2_name": "opponent",
+        "team1_ft_score": i,
+        "team2_ft_score": 1,
+        "venue": "team1",
+        "team1_id": None,
+        "team2_id": None,
+        "event_id": 1,
+        "season_id": 1,
+        "group": 0,
+        "team1_points": 3,
+        "team2_points": 0,
+    }
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    collection = FakeCollection([make_document(i) for i in range(5)])
+    monkeypatch.setattr(MatchMongoRepository, "db_session", collection)
+    return collection
+
+
+def test_iter_search_is_lazy(collection):
+    matches = MatchMongoRepository.iter_search(
+        {"team1_ft_score": {"$gte": 1}, "team2_name": "opponent"},
+        projection=["team1_name", "team1_ft_score"],
+        sort=[("date", -1)],
+        limit=2,
+        batch_size=50,
+    )
+    assert not collection.calls
+
+    first = next(matches)
+    assert first.team1_name == "team0"
+    assert not hasattr(first, "team2_name")
+
+    query, options = collection.calls[0]
+    assert options["projection"] == {"_id": False, "team1_name": True, "team1_ft_score": True}
+    assert options["sort"] == [("date", -1)] and options["batch_size"] == 50
+    assert len([first, *matches]) == 2
+
+    with pytest.raises(ValueError):
+        list(MatchMongoRepository.iter_search(projection=["unknown"]))
+
+
+def test_search_converts_object_id(collection):
+    _id = ObjectId()
+    assert len(MatchMongoRepository.search("_id", str(_id))) == 5
+    assert collection.calls[0][0] == {"_id": _id}
+
+
+def test_iter_batches(collection):
+    batches = list(MatchMongoRepository.iter_batches(batch_size=2))
+
+    assert [len(b) for b in batches] == [2, 2, 1]
+    assert isinstance(batches[0], MatchBatch)
+    assert list(MatchBatch.concat(batches)["team1_ft_score"]) == [0, 1, 2, 3, 4]
+
+
+class FakeWriteCollection:
+    """Collection stand-in with unique (date, team1_name, team2_name) key."""
+
+    def __init__(self):
+        self.documents = {}
+        self.lock = threading.Lock()
+
+    def key(self, document):
+        return tuple(document.get(k) for k in UNIQUE_KEY)
+
+    def insert_many(self, documents, ordered):
+        errors = []
+        with self.lock:
+            for i, document in enumerate(documents):
+                if document.get("team1_ft_score") is None:
+                    errors.append({"index": i, "code": 121, "errmsg": "validation"})
+                elif self.key(document) in self.documents:
+                    errors.append({"index": i, "code": 11000, "errmsg": "duplicate"})
+                else:
+                    self.documents[self.key(document)] = document
+
+        if errors:
+            inserted = len(documents) - len(errors)
+            raise BulkWriteError({"writeErrors": errors, "nInserted": inserted})
+
+        return SimpleNamespace(inserted_ids=[None] * len(documents))
+
+    def bulk_write(self, requests, ordered):
+        upserted = matched = 0
+        with self.lock:
+            for request in requests:
+                document = request._doc
+                matched += self.key(document) in self.documents
+                upserted += self.key(document) not in self.documents
+                self.documents[self.key(document)] = document
+
+        return SimpleNamespace(upserted_count=upserted, matched_count=matched)
+
+
+def test_bulk_insert_skips_duplicates(monkeypatch):
+    collection = FakeWriteCollection()
+    monkeypatch.setattr(MatchMongoRepository, "db_session", collection)
+
+    matches = [FootballMatch.from_dict(make_document(i)) for i in range(10)]
+    result = MatchMongoRepository.insert_many(matches[:4], chunk_size=3)
+    assert (result.inserted, result.skipped, result.failed) == (4, 0, 0)
+
+    matches[8].team1_ft_score = None
+    result = MatchMongoRepository.insert_many(matches, chunk_size=3, workers=2)
+
+    assert (result.inserted, result.skipped, result.failed) == (5, 4, 1)
+    assert result.errors == [{"index": 8, "code": 121, "errmsg": "validation"}]
+    assert result.total == len(matches)
+
+
+def test_bulk_upsert(monkeypatch):
+    collection = FakeWriteCollection()
+    monkeypatch.setattr(MatchMongoRepository, "db_session", collection)
+
+    matches = [FootballMatch.from_dict(make_document(i)) for i in range(5)]
+    MatchMongoRepository.insert_many(matches[:2])
+    result = MatchMongoRepository.insert_many(matches, upsert=True, chunk_size=2)
+
+    assert (result.inserted, result.updated, result.skipped) == (3, 2, 0)
+    assert len(collection.documents) == 5
+
+
+def test_async_repository_does_not_block_loop(collection, monkeypatch):
+    find = collection.find
+
+    def slow_find(query, **options):
+        time.sleep(0.1)
+        return find(query, **options)
+
+    monkeypatch.setattr(collection, "find", slow_find)
+    repo = AsyncMatchMongoRepository()
+
+    async def run():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticker = asyncio.create_task(tick())
+        matches = await repo.search("team2_name", "opponent")
+        streamed = [m async for m in repo.iter_search(limit=3, batch_size=2)]
+        ticker.cancel()
+        await repo.aclose()
+        return matches, streamed, ticks
+
+    matches, streamed, ticks = asyncio.run(run())
+
+    assert len(matches) == 5
+    assert [m.team1_name for m in streamed] == ["team0", "team1", "team2"]
+    assert ticks >= 5
+
+
+def test_collection_is_opened_lazily(monkeypatch):
+    opened = []
+
+    def open_collection():
+        opened.append(True)
+        return FakeCollection([])
+
+    monkeypatch.setattr(MatchMongoRepository, "_db_session", None)
+    monkeypatch.setattr(MatchMongoRepository, "open_collection", open_collection)
+
+    assert not opened
+    assert MatchMongoRepository.db_session is MatchMongoRepository.db_session
+    assert len(opened) == 1
+
+
+def test_from_file_ignores_unknown_keys(tmp_path):
+    document = {"_id": "5f3e2a", "team1_name": "Arsenal", "team1_ft_score": 1}
+    path = tmp_path / "matches.json"
+    path.write_text(json.dumps([document]))
+
+    matches = MatchMongoRepository.from_file(str(path), FootballMatch)
+
+    assert [(m.team1_name, m.team1_ft_score) for m in matches] == [("Arsenal", 1)]
+    assert matches[0].match_type == "football"
+
+
+def test_async_iter_search_closes_cursor_early(collection):
+    repo = AsyncMatchMongoRepository()
+
+    async def run():
+        matches = repo.iter_search(batch_size=2)
+        async for match in matches:
+            break
+
+        await matches.aclose()
+        await repo.aclose()
+        return match
+
+    match = asyncio.run(run())
+
+    assert match.team1_name == "team0"
+    assert len(collection.closed_by) == 1
+    assert collection.closed_by[0] != threading.get_ident()
@@ -0,0 +1,425 @@
+import asyncio
+import contextlib
+import itertools
+import time
+from collections import defaultdict
+from datetime import date, datetime
+
+import asyncpg
+import numpy as np
+import pytest
+
+from domain import MatchBatch
+from repository.base import PgClient, PoolStats, read_from_primary
+from repository.cache import ResultCache
+from repository.migrations import MigrationRunner
+from repository.postgresql_repo import (
+    GAME_CHANGES_CHANNEL,
+    MatchPgRepository,
+    game_row_to_match,
+    projection,
+)
+from repository.statements import PreparedConnection, statements
+
+
+def test_projection_whitelist():
+    assert projection(["id", "home_team"]) == "g.id, h.name AS home_team"
+
+    with pytest.raises(ValueError):
+        projection(["id", "home_team; DROP TABLE game"])
+
+    with pytest.raises(ValueError):
+        projection([])
+
+
+def test_game_row_to_match():
+    row = {
+        "id": 10,
+        "home_team": "Arsenal",
+        "away_team": "Chelsea",
+        "date": date(2021, 5, 1),
+        "home_team_score": 2,
+        "away_team_score": 1,
+        "home_team_shots": 12,
+    }
+
+    match = game_row_to_match(row)
+
+    assert match.team1_name == "Arsenal" and match.team2_name == "Chelsea"
+    assert match.date == datetime(2021, 5, 1)
+    assert match.is_home_win()
+    assert not hasattr(match, "team1_points")
+
+
+class FakeConnection:
+    """Records executed statements, fetch returns the queued results."""
+
+    def __init__(self, *results):
+        self.queries = 0
+        self.executed = []
+        self.results = list(results)
+
+    @contextlib.asynccontextmanager
+    async def transaction(self):
+        yield
+
+    async def execute(self, query, *args):
+        self.executed.append((query, args))
+
+    async def executemany(self, query, records):
+        self.executed.append((query, records))
+
+    async def fetch(self, query, *args):
+        self.executed.append((query, args))
+        return self.results.pop(0) if self.results else []
+
+    async def fetchval(self, query, *args):
+        self.executed.append((query, args))
+        return self.results.pop(0) if self.results else None
+
+    def cursor(self, query, *args, prefetch=None):
+        self.executed.append((query, args))
+        records = self.results.pop(0)
+
+        async def iterate():
+            for record in records:
+                yield record
+
+        return iterate()
+
+
+class FakeRecord(dict):
+    """Iterates over values, like asyncpg.Record."""
+
+    def __iter__(self):
+        return iter(self.values())
+
+
+class FakePool:
+    def __init__(self, connection=None):
+        self.connection = connection or FakeConnection()
+
+    @contextlib.asynccontextmanager
+    async def acquire(self):
+        yield self.connection
+
+
+def make_client(*readonly_pools):
+    # bypass singleton, client isn't connected to a database
+    client = object.__new__(PgClient)
+    client.pools = {PgClient.PRIMARY_POOL: FakePool()}
+    client.pool_stats = {PgClient.PRIMARY_POOL: PoolStats(readonly=False, max_size=1)}
+    for name in readonly_pools:
+        client.pools[name] = FakePool()
+        client.pool_stats[name] = PoolStats(readonly=True, max_size=1)
+
+    client.read_pools = itertools.cycle(readonly_pools or [PgClient.PRIMARY_POOL])
+    return client
+
+
+def test_read_from_primary():
+    client = make_client("replica")
+
+    async def run():
+        read_from_primary.set(True)
+        async with client.acquire(readonly=True) as con:
+            return con
+
+    assert asyncio.run(run()) is client.pools[PgClient.PRIMARY_POOL].connection
+
+
+def test_read_write_routing():
+    client = make_client("replica1", "replica2")
+
+    async def run():
+        used = []
+        for readonly in (False, True, True, True):
+            async with client.acquire(readonly=readonly) as con:
+                assert client.pool_stats[PgClient.PRIMARY_POOL].in_use == (not readonly)
+                con.queries += 2
+                used.append(con)
+
+        return used
+
+    used = asyncio.run(run())
+    pools = client.pools
+
+    assert used == [
+        pools["primary"].connection,
+        pools["replica1"].connection,
+        pools["replica2"].connection,
+        pools["replica1"].connection,
+    ]
+
+    stats = client.stats()
+    assert stats["primary"]["queries"] == 2 and stats["primary"]["in_use"] == 0
+    assert stats["replica1"]["acquires"] == 2 and stats["replica1"]["queries"] == 4
+    assert stats["replica1"]["qps"] > 0
+
+
+class FakeListenerConnection:
+    def __init__(self):
+        self.channels = set()
+        self.termination_listeners = []
+        self.closed = False
+
+    async def add_listener(self, channel, callback):
+        self.channels.add(channel)
+
+    def add_termination_listener(self, callback):
+        self.termination_listeners.append(callback)
+
+    def is_closed(self):
+        return self.closed
+
+    def terminate(self):
+        self.closed = True
+        for callback in self.termination_listeners:
+            callback(self)
+
+
+def test_listener_reconnects_and_bypasses_cache(monkeypatch):
+    connections, failures = [], [OSError("connection refused")]
+
+    async def connect(**kwargs):
+        if len(connections) == 1 and failures:
+            raise failures.pop()
+        connections.append(FakeListenerConnection())
+        return connections[-1]
+
+    monkeypatch.setattr(asyncpg, "connect", connect)
+
+    client = make_client()
+    client.db_config = {
+        "user": "fox",
+        "password": "",
+        "database": "fox_cub",
+        "host": "localhost",
+        "port": 5432,
+        "listener_retry_delay": 0.001,
+    }
+    client.listener_conn, client.listeners = None, defaultdict(list)
+    client.listening, client.listener_task = False, None
+    cache = ResultCache()
+    repo = MatchPgRepository(client, cache)
+
+    async def run():
+        await repo.subscribe_invalidations()
+        cache.set("stats", [1])
+
+        connections[0].terminate()
+        assert not client.listening
+        # writes of other processes can't be seen, results aren't cached
+        assert cache.get("stats") == (False, None)
+        cache.set("stats", [2])
+        assert cache.get("stats") == (False, None)
+
+        while not client.listening:
+            await asyncio.sleep(0.001)
+
+    asyncio.run(run())
+    assert not failures and len(connections) == 2
+    assert connections[1].channels == {GAME_CHANGES_CHANNEL}
+
+    cache.set("stats", [3])
+    assert cache.get("stats") == (True, [3])
+
+
+def test_migrations_run_before_pools(monkeypatch):
+    calls = []
+
+    class MigrationConnection:
+        closed = False
+
+        async def close(self):
+            self.closed = True
+
+    migration_con = MigrationConnection()
+
+    async def connect(**kwargs):
+        return migration_con
+
+    async def migrate(self, con):
+        calls.append(("migrate", con.closed))
+        return []
+
+    async def create_pool(config):
+        calls.append(("pool", migration_con.closed))
+        return object.__new__(asyncpg.pool.Pool)
+
+    monkeypatch.setattr(asyncpg, "connect", connect)
+    monkeypatch.setattr(MigrationRunner, "migrate", migrate)
+
+    client = object.__new__(PgClient)
+    client.db_config = {
+        "user": "fox",
+        "password": "",
+        "database": "fox_cub",
+        "host": "localhost",
+        "port": 5432,
+        "migrate_on_startup": True,
+    }
+    client.pools, client.pool_stats = {}, {}
+    client.create_pool = create_pool
+
+    asyncio.run(client.init_connection())
+
+    # pool connections prepare statements against the migrated schema
+    assert calls == [("migrate", False), ("pool", True)]
+
+
+def test_stale_prepared_statement_is_prepared_again():
+    prepared = []
+
+    class FakeStatement:
+        def __init__(self, stale):
+            self.stale = stale
+
+        async def fetch(self, *args):
+            if self.stale:
+                raise asyncpg.exceptions.InvalidCachedStatementError(
+                    "cached statement plan is invalid"
+                )
+            return [args]
+
+    async def prepare(query):
+        prepared.append(query)
+        return FakeStatement(stale=False)
+
+    # bypass connect, __del__ sees the connection as closed
+    con = object.__new__(PreparedConnection)
+    con._aborted = True
+    con.queries, con.prepare = 0, prepare
+    con.is_in_transaction = lambda: False
+    con.prepared_statements = {"game.get_by_event": FakeStatement(stale=True)}
+
+    assert asyncio.run(con.fetch_prepared("game.get_by_event", 1)) == [(1,)]
+    assert prepared == [statements["game.get_by_event"]]
+    assert not con.prepared_statements["game.get_by_event"].stale
+
+
+def test_insert_many_stores_nan_xg_as_null(monkeypatch):
+    client = make_client()
+    con = client.pools[PgClient.PRIMARY_POOL].connection
+    repo = MatchPgRepository(client)
+
+    async def get_or_create_many(names):
+        return {name: i for i, name in enumerate(sorted(names))}
+
+    async def ensure_partitions(season_ids):
+        pass
+
+    monkeypatch.setattr(repo.teams, "get_or_create_many", get_or_create_many)
+    monkeypatch.setattr(repo, "ensure_partitions", ensure_partitions)
+    batch = MatchBatch.from_dicts(
+        [
+            {
+                "team1_name": "Arsenal",
+                "team2_name": "Chelsea",
+                "team1_ft_score": 1,
+                "team2_ft_score": 0,
+                "team_1xg": 1.5,
+            }
+        ]
+    )
+    assert np.isnan(batch["team_2xg"][0])
+
+    asyncio.run(repo.insert_many(batch))
+
+    (records,) = [args for query, args in con.executed if "INSERT INTO game_staging" in query]
+    assert records[0][:2] == (0, 1)
+    assert records[0][-2:] == (1.5, None)
+
+
+def test_rebuild_team_season_stats_notifies(monkeypatch):
+    client = make_client()
+    client.pools[PgClient.PRIMARY_POOL] = FakePool(
+        FakeConnection([{"event_id": 1, "season_id": 2}])
+    )
+    con = client.pools[PgClient.PRIMARY_POOL].connection
+    cache = ResultCache()
+    cache.set("epl", [1], event_ids=[1], season_ids=[2])
+    cache.set("mls", [2], event_ids=[3], season_ids=[2])
+
+    asyncio.run(MatchPgRepository(client, cache).rebuild_team_season_stats())
+
+    assert ("SELECT pg_notify($1, $2);", (GAME_CHANGES_CHANNEL, "1:2")) in con.executed
+    assert cache.get("epl") == (False, None)
+    assert cache.get("mls") == (True, [2])
+
+
+def test_sync_columnar_seeds_missing_sync_row():
+    client = make_client()
+    con = FakeConnection(10, 0, [{"event_id": 1, "season_id": 2, "games": 10}])
+    client.pools[PgClient.PRIMARY_POOL] = FakePool(con)
+
+    assert asyncio.run(MatchPgRepository(client).sync_columnar()) == 10
+
+    queries = [" ".join(query.split()) for query, args in con.executed]
+    seed = queries.index(
+        "INSERT INTO columnar_sync (source, last_id) VALUES ('game', 0) "
+        "ON CONFLICT DO NOTHING;"
+    )
+    assert queries[seed + 1].startswith("SELECT last_id FROM columnar_sync")
+    (copy_args,) = [args for query, args in con.executed if "game_columnar (" in query]
+    assert copy_args == (0, 10)
+
+
+def test_detach_season(monkeypatch):
+    client = make_client()
+    con = FakeConnection([{"event_id": 1, "season_id": 7}])
+    client.pools[PgClient.PRIMARY_POOL] = FakePool(con)
+    monkeypatch.setattr(MatchPgRepository, "partitions", {7, 8})
+    monkeypatch.setattr(time, "time", lambda: 1600000000.5)
+    repo = MatchPgRepository(client)
+
+    asyncio.run(repo.detach_season(7, archive_schema='archive"; DROP TABLE game; --'))
+
+    queries = [query for query, args in con.executed]
+    assert queries[:3] == [
+        "ALTER TABLE game DETACH PARTITION game_season_7;",
+        "ALTER TABLE game_season_7 RENAME TO game_season_7_detached_1600000000;",
+        'CREATE SCHEMA IF NOT EXISTS "archive""; DROP TABLE game; --";'
+        'ALTER TABLE game_season_7_detached_1600000000 '
+        'SET SCHEMA "archive""; DROP TABLE game; --";',
+    ]
+    assert repo.partitions == {8}
+
+    # partitions detached by other processes are forgotten too
+    repo._on_game_changes("1:8")
+    assert repo.partitions == set()
+
+
+def test_iter_batches():
+    records = [
+        FakeRecord(
+            home_team="Arsenal",
+            away_team="Chelsea",
+            date=date(2021, 5, i),
+            event_id=1,
+            season_id=2,
+            home_team_score=i,
+            away_team_score=1,
+            home_team_points=3,
+            away_team_points=0,
+            home_team_xg=None,
+            away_team_xg=0.5,
+        )
+        for i in range(1, 4)
+    ]
+    client = make_client()
+    client.pools[PgClient.PRIMARY_POOL] = FakePool(FakeConnection(records))
+
+    async def run():
+        repo = MatchPgRepository(client)
+        return [b async for b in repo.iter_batches([1], batch_size=2)]
+
+    batches = asyncio.run(run())
+
+    assert [len(b) for b in batches] == [2, 1]
+    assert batches[0]["team1_ft_score"].tolist() == [1, 2]
+    assert batches[1].is_home_win().tolist() == [True]
+    match = batches[0][1].to_match()
+    assert match.date == datetime(2021, 5, 2) and match.team1_name == "Arsenal"
+    assert match.team_1xg != match.team_1xg and match.team_2xg == 0.5
+    assert match.group is None and match.team1_ht_score is None